@@ -4,13 +4,33 @@
 LeetCode 30-Day Study Plan System - Flask Backend
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g, has_request_context
 from flask_cors import CORS
 import sqlite3
 import json
 import os
-from datetime import datetime, timedelta
+import sys
+import time
+import base64
+import bisect
+import hashlib
+import mmap
+import random
+import secrets
+import socket
+import itertools
+import struct
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from functools import wraps
+from pathlib import Path
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from typing import List, Dict, Optional
+from storage import Storage, SQLiteStorage
+import maintenance
 
 app = Flask(__name__)
 CORS(app)
@@ -20,19 +40,123 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
 DATABASE = os.path.join(DATA_DIR, 'leetcode_plan.db')
+QUESTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions.json')
+# Compiled catalogue + plan shared read-only by every worker through mmap
+SNAPSHOT_FILE = os.path.join(DATA_DIR, 'catalogue.snap')
+# Online backups written by the backup job, manage.py and the admin endpoint
+BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(DATA_DIR, 'backups'))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '7'))
+# Seconds between maintenance passes (checkpoint, incremental vacuum, optimize) and backups; 0 disables
+MAINTENANCE_INTERVAL = int(os.environ.get('MAINTENANCE_INTERVAL', '3600'))
+BACKUP_INTERVAL = int(os.environ.get('BACKUP_INTERVAL', '86400'))
+# Bytes the WAL is truncated back to after a checkpoint
+WAL_SIZE_LIMIT = int(os.environ.get('WAL_SIZE_LIMIT', str(64 * 1024 * 1024)))
+# Required in X-Admin-Token for /api/admin/*; admin endpoints are disabled while unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# How often (seconds) requests check questions.json for changes
+CATALOGUE_CHECK_INTERVAL = 2.0
+
+# Bump SCHEMA_VERSION whenever init_db changes the schema, and DATA_VERSION whenever
+# populate_questions changes the seeded data; a warm boot with both current skips all work
+SCHEMA_VERSION = 11
+DATA_VERSION = 2
 
 # Database connection helper
-def get_db_connection(timeout=10.0):
+def get_db_connection(timeout=10.0, check_same_thread=True):
     """Get database connection with timeout"""
-    conn = sqlite3.connect(DATABASE, timeout=timeout)
+    conn = sqlite3.connect(DATABASE, timeout=timeout, check_same_thread=check_same_thread)
     conn.execute('PRAGMA journal_mode=WAL')  # Enable Write-Ahead Logging for better concurrency
+    conn.execute(f'PRAGMA journal_size_limit = {WAL_SIZE_LIMIT}')
+    return conn
+
+# Idle read-only connections kept per process for GET endpoints
+READ_POOL_SIZE = int(os.environ.get('READ_POOL_SIZE', '8'))
+_read_pool = queue.LifoQueue()
+
+def open_read_connection():
+    """Read-only connection: opened with mode=ro and query_only, so it never takes the write lock"""
+    uri = f"{Path(DATABASE).absolute().as_uri()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=10.0, check_same_thread=False)
+    conn.execute('PRAGMA query_only = ON')
     return conn
 
+def acquire_read_connection():
+    """Borrow a pooled read-only connection, opening one if the pool is empty"""
+    while True:
+        try:
+            database, conn = _read_pool.get_nowait()
+        except queue.Empty:
+            return open_read_connection()
+        if database == DATABASE:
+            conn.row_factory = None
+            return conn
+        conn.close()  # Opened against a database path that has since changed
+
+def release_read_connection(conn):
+    """Return a read connection to the pool (or close it when the pool is full)"""
+    if conn.in_transaction:
+        conn.rollback()
+    if _read_pool.qsize() < READ_POOL_SIZE:
+        _read_pool.put((DATABASE, conn))
+    else:
+        conn.close()
+
+@contextmanager
+def read_connection():
+    conn = acquire_read_connection()
+    try:
+        yield conn
+    finally:
+        release_read_connection(conn)
+
+# One long-lived writer connection per process; write requests and jobs take turns on it
+_writer = {'conn': None, 'database': None, 'depth': 0}
+_writer_lock = threading.RLock()
+
+@contextmanager
+def writer_connection():
+    """The process's dedicated writer connection; anything left uncommitted is rolled back.
+    
+    Re-entering from the same thread joins the outer block, which owns the rollback.
+    """
+    with _writer_lock:
+        if _writer['depth'] == 0 and (_writer['conn'] is None or _writer['database'] != DATABASE):
+            if _writer['conn'] is not None:
+                _writer['conn'].close()
+            _writer['conn'] = get_db_connection(check_same_thread=False)
+            _writer['database'] = DATABASE
+        conn = _writer['conn']
+        if _writer['depth'] == 0:
+            conn.row_factory = None
+        _writer['depth'] += 1
+        try:
+            yield conn
+        finally:
+            _writer['depth'] -= 1
+            if _writer['depth'] == 0 and conn.in_transaction:
+                conn.rollback()
+
+def get_storage(conn=None) -> Storage:
+    """SQLite storage that joins conn's transaction, or reads from the read-only pool without one.
+    
+    Writes pass the writer connection (see writer_connection).
+    """
+    if conn is not None:
+        return SQLiteStorage(conn)
+    return SQLiteStorage(acquire_read_connection(), release=release_read_connection)
+
 def init_db():
     """Initialize database"""
     conn = get_db_connection()
     c = conn.cursor()
     
+    # auto_vacuum can only be chosen while the file is still empty; existing
+    # databases are converted once with `python manage.py vacuum --full`
+    if c.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+        c.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        c.execute('VACUUM')
+    
     # Questions table
     c.execute('''
         CREATE TABLE IF NOT EXISTS questions (
@@ -47,6 +171,8 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_questions_day ON questions (day_number, session)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_questions_category ON questions (category)')
     
     # Progress table
     c.execute('''
@@ -62,6 +188,8 @@ def init_db():
             last_review_date DATE,
             deferred BOOLEAN DEFAULT 0,
             deferred_date DATE,
+            completed_day INTEGER,
+            last_review_day INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (question_id) REFERENCES questions (id)
         )
@@ -77,18 +205,211 @@ def init_db():
         c.execute('ALTER TABLE progress ADD COLUMN deferred_date DATE')
     except sqlite3.OperationalError:
         pass  # Column already exists
+    # The deferred list pages on (deferred_date, id); date rows deferred before it was recorded
+    c.execute('''
+        UPDATE progress SET deferred_date = COALESCE(date(created_at), '1970-01-01')
+        WHERE deferred = 1 AND deferred_date IS NULL
+    ''')
+    
+    # Epoch-day copies of the completion dates, so day math is integer comparison.
+    # Existing rows are converted from the TEXT dates once, when the columns are added
+    try:
+        c.execute('ALTER TABLE progress ADD COLUMN completed_day INTEGER')
+        c.execute('ALTER TABLE progress ADD COLUMN last_review_day INTEGER')
+        c.execute(f'''
+            UPDATE progress
+            SET completed_day = {EPOCH_DAY_SQL.format('completed_date')},
+                last_review_day = {EPOCH_DAY_SQL.format('last_review_date')}
+            WHERE completed_date IS NOT NULL OR last_review_date IS NOT NULL
+        ''')
+    except sqlite3.OperationalError:
+        pass  # Columns already exist
+    # Also orders the review list's keyset pages, so it carries is_correct and id
+    c.execute('DROP INDEX IF EXISTS idx_progress_completed_day')
+    c.execute('CREATE INDEX idx_progress_completed_day ON progress (completed_day DESC, is_correct, id)')
+    
+    # Indexes backing keyset pagination of the deferred and review lists
+    c.execute('CREATE INDEX IF NOT EXISTS idx_progress_deferred ON progress (deferred, deferred_date, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_progress_completed ON progress (completed_date, is_correct, id)')
+    
+    # Change log for delta sync: one row per progress write, versions only ever increase
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT DEFAULT 'default',
+            question_id INTEGER NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_change_log_user_version ON change_log (user_id, version)')
+    
+    # Keep the change log in sync with every write path to progress
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_log_insert AFTER INSERT ON progress
+        BEGIN
+            INSERT INTO change_log (user_id, question_id) VALUES (NEW.user_id, NEW.question_id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_log_update AFTER UPDATE ON progress
+        BEGIN
+            INSERT INTO change_log (user_id, question_id) VALUES (NEW.user_id, NEW.question_id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_log_delete AFTER DELETE ON progress
+        BEGIN
+            INSERT INTO change_log (user_id, question_id) VALUES (OLD.user_id, OLD.question_id);
+        END
+    ''')
+    
+    # Append-only attempt log; progress holds the latest state derived from it
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT DEFAULT 'default',
+            question_id INTEGER NOT NULL,
+            attempt_date DATE NOT NULL,
+            is_correct BOOLEAN,
+            time_spent INTEGER,
+            attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_attempts_user_time ON attempts (user_id, attempted_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_attempts_question ON attempts (question_id, id)')
+    
+    # Seed the log from existing progress rows the first time it is created
+    c.execute('SELECT 1 FROM attempts LIMIT 1')
+    if not c.fetchone():
+        c.execute('''
+            INSERT INTO attempts (user_id, question_id, attempt_date, is_correct, time_spent)
+            SELECT user_id, question_id, completed_date, is_correct, time_spent
+            FROM progress
+            WHERE completed_date IS NOT NULL
+            ORDER BY completed_date, id
+        ''')
+    
+    # Timer events, append-only: a session is the events after the question's last 'finish'
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS timing_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT DEFAULT 'default',
+            question_id INTEGER NOT NULL,
+            event TEXT NOT NULL CHECK (event IN ('start', 'pause', 'finish')),
+            at REAL NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_timing_events_question ON timing_events (user_id, question_id, id)')
+    
+    # Per-question time totals, added to as each timed session finishes
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS question_time (
+            user_id TEXT NOT NULL,
+            question_id INTEGER NOT NULL,
+            total_seconds INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            last_finished_at REAL,
+            PRIMARY KEY (user_id, question_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Per-day, per-category rollups of the attempt log, maintained on write
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            user_id TEXT NOT NULL DEFAULT 'default',
+            day DATE NOT NULL,
+            category TEXT NOT NULL,
+            solved INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            wrong INTEGER NOT NULL DEFAULT 0,
+            time_spent INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, category)
+        ) WITHOUT ROWID
+    ''')
+    
+    c.execute('SELECT 1 FROM daily_rollups LIMIT 1')
+    if not c.fetchone():
+        c.execute('SELECT DISTINCT user_id FROM attempts')
+        for (user_id,) in c.fetchall():
+            rebuild_rollups(c, user_id)
+    # solved used to count wrong attempts as well; it counts correct ones only
+    c.execute('UPDATE daily_rollups SET solved = correct WHERE solved != correct')
+    
+    # Full-text search over question titles, categories and notes (rowid = question id)
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    search_index_exists = c.fetchone() is not None
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title, category, notes,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        create_search_triggers(c)
+        if not search_index_exists:
+            c.execute('''
+                INSERT INTO search_index (rowid, title, category, notes)
+                SELECT q.id, q.title, q.category, p.notes
+                FROM questions q
+                LEFT JOIN progress p ON p.question_id = q.id
+            ''')
+    except sqlite3.OperationalError as e:
+        print(f"Warning: Full-text search disabled, FTS5 is unavailable: {e}")
     
-    # Daily plans table
+    # Daily plans table: each day's static plan, materialized at seed time.
+    # sessions is JSON {"morning": [ids], "afternoon": [...], "evening": [...]}
     c.execute('''
         CREATE TABLE IF NOT EXISTS daily_plans (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             day_number INTEGER NOT NULL UNIQUE,
             date DATE,
             status TEXT DEFAULT 'pending',
+            description TEXT,
+            focus TEXT,
+            sessions TEXT NOT NULL DEFAULT '{}',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Add plan columns if they don't exist (for existing databases)
+    for column in ('description TEXT', 'focus TEXT', "sessions TEXT NOT NULL DEFAULT '{}'"):
+        try:
+            c.execute(f'ALTER TABLE daily_plans ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    
+    # Background job state; a node runs a job only while it holds the lease
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            schedule TEXT NOT NULL,
+            next_run REAL NOT NULL,
+            last_started TEXT,
+            last_finished TEXT,
+            last_status TEXT,
+            last_error TEXT,
+            last_duration_ms INTEGER,
+            run_count INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    # Precomputed "today" plan per user, valid while state_key still matches
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plan_bundles (
+            user_id TEXT NOT NULL DEFAULT 'default',
+            bundle_date TEXT NOT NULL,
+            study_day INTEGER NOT NULL,
+            state_key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, bundle_date)
+        )
+    ''')
+    
     # Statistics table
     c.execute('''
         CREATE TABLE IF NOT EXISTS statistics (
@@ -98,11 +419,70 @@ def init_db():
             total_correct INTEGER DEFAULT 0,
             total_wrong INTEGER DEFAULT 0,
             streak_days INTEGER DEFAULT 0,
+            longest_streak INTEGER DEFAULT 0,
             last_study_date DATE,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Add longest_streak for existing databases and backfill streaks once from history
+    try:
+        c.execute('ALTER TABLE statistics ADD COLUMN longest_streak INTEGER DEFAULT 0')
+        needs_streak_backfill = True
+    except sqlite3.OperationalError:
+        needs_streak_backfill = False  # Column already exists
+    if needs_streak_backfill:
+        rebuild_streak(c)
+    
+    # Leaderboard scores, one row per user; version orders writes so workers refresh incrementally
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS user_scores (
+            user_id TEXT PRIMARY KEY,
+            solved INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL,
+            removed INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Removed users keep a tombstone row, so every worker sees the removal by version
+    try:
+        c.execute('ALTER TABLE user_scores ADD COLUMN removed INTEGER NOT NULL DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    c.execute('CREATE INDEX IF NOT EXISTS idx_user_scores_version ON user_scores (version)')
+    
+    # Cohort membership; every user is also implicitly in the 'all' cohort
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS cohort_members (
+            cohort TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (cohort, user_id)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_cohort_members_user ON cohort_members (user_id)')
+    
+    c.execute('SELECT COUNT(*) FROM user_scores')
+    if c.fetchone()[0] == 0:
+        c.execute('SELECT DISTINCT user_id FROM statistics WHERE user_id IS NOT NULL')
+        for (user_id,) in c.fetchall():
+            record_user_score(c, user_id)
+    
+    # Saved practice sets: a filter definition, shared by its token
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS practice_sets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT DEFAULT 'default',
+            name TEXT NOT NULL,
+            filters TEXT NOT NULL,
+            share_token TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_practice_sets_user ON practice_sets (user_id, id)')
+    
     # User settings table (for start date)
     c.execute('''
         CREATE TABLE IF NOT EXISTS user_settings (
@@ -120,65 +500,102 @@ def init_db():
         c.execute('INSERT INTO user_settings (setting_key, setting_value) VALUES (?, ?)', 
                  ('start_date', today))
     
+    c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     conn.commit()
     conn.close()
 
+def get_db_versions():
+    """Get (schema_version, data_version) stamped in the database"""
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute('PRAGMA user_version')
+        schema_version = c.fetchone()[0]
+        if schema_version == 0:
+            return 0, 0  # Fresh database, nothing created yet
+        c.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?', ('data_version',))
+        result = c.fetchone()
+        return schema_version, int(result[0]) if result else 0
+    finally:
+        conn.close()
+
+def initialize_database():
+    """Bring schema and seed data up to date; a warm boot is a single version check"""
+    started = time.perf_counter()
+    schema_version, data_version = get_db_versions()
+    
+    steps = []
+    if schema_version < SCHEMA_VERSION:
+        init_db()
+        steps.append(f"schema v{schema_version} -> v{SCHEMA_VERSION}")
+    if data_version < DATA_VERSION:
+        populate_questions()
+        steps.append(f"data v{data_version} -> v{DATA_VERSION}")
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if steps:
+        print(f"Database initialized in {elapsed_ms:.1f} ms ({', '.join(steps)})")
+    else:
+        print(f"Database up to date (schema v{SCHEMA_VERSION}, data v{DATA_VERSION}), warm start in {elapsed_ms:.1f} ms")
+
+def create_search_triggers(c):
+    """Keep search_index in sync with questions and progress notes"""
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_search_insert AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO search_index (rowid, title, category, notes)
+            VALUES (NEW.id, NEW.title, NEW.category,
+                    (SELECT notes FROM progress WHERE question_id = NEW.id));
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_search_update AFTER UPDATE OF title, category ON questions
+        BEGIN
+            UPDATE search_index SET title = NEW.title, category = NEW.category WHERE rowid = NEW.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS questions_search_delete AFTER DELETE ON questions
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_search_insert AFTER INSERT ON progress
+        WHEN NEW.notes IS NOT NULL
+        BEGIN
+            UPDATE search_index SET notes = NEW.notes WHERE rowid = NEW.question_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_search_update AFTER UPDATE OF notes ON progress
+        BEGIN
+            UPDATE search_index SET notes = NEW.notes WHERE rowid = NEW.question_id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_search_delete AFTER DELETE ON progress
+        BEGIN
+            UPDATE search_index SET notes = NULL WHERE rowid = OLD.question_id;
+        END
+    ''')
+
 def load_questions_data():
     """Load questions data"""
-    with open('questions.json', 'r', encoding='utf-8') as f:
+    with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def update_categories():
-    """Update category names from Chinese to English"""
-    category_mapping = {
-        '数组和哈希表': 'Arrays & Hash Tables',
-        '双指针': 'Two Pointers',
-        '滑动窗口': 'Sliding Window',
-        '栈': 'Stack',
-        '二分查找': 'Binary Search',
-        '链表': 'Linked List',
-        '树': 'Tree',
-        '堆/优先队列': 'Heap / Priority Queue',
-        '回溯': 'Backtracking',
-        '图': 'Graph',
-        '动态规划': 'Dynamic Programming',
-        '贪心': 'Greedy',
-        '区间': 'Intervals',
-        '数学': 'Math',
-        '位运算': 'Bit Manipulation',
-        '其他': 'Other'
-    }
-    
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    for old_category, new_category in category_mapping.items():
-        c.execute('''
-            UPDATE questions 
-            SET category = ? 
-            WHERE category = ?
-        ''', (new_category, old_category))
-    
-    conn.commit()
-    conn.close()
-    print(f"Updated {len(category_mapping)} category names to English")
+def questions_file_hash():
+    """Get the SHA-256 of questions.json"""
+    with open(QUESTIONS_FILE, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-def populate_questions():
-    """Import questions data into database"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Check if data already exists
-    c.execute('SELECT COUNT(*) FROM questions')
-    if c.fetchone()[0] > 0:
-        # Update existing categories to English
-        update_categories()
-        conn.close()
-        return
-    
-    data = load_questions_data()
-    study_plan = create_30_day_plan()
+def build_question_rows(data, study_plan) -> Dict[int, tuple]:
+    """Build the questions table contents from the catalogue and the study plan.
     
+    Returns {id: (title, difficulty, category, leetcode_id, day_number, session, description)};
+    a question listed on several days keeps its first assignment.
+    """
     question_id_map = {}
     for category, cat_data in data['categories'].items():
         for q in cat_data['questions']:
@@ -188,19 +605,15 @@ def populate_questions():
                 'category': category
             }
     
-    # Insert questions and assign to days
+    rows = {}
     for day_num, day_plan in study_plan.items():
         for session, questions in day_plan['sessions'].items():
             for q_info in questions:
                 leetcode_id = q_info['id']
+                if leetcode_id in rows:
+                    continue
                 q_data = question_id_map.get(leetcode_id, {})
-                
-                c.execute('''
-                    INSERT OR IGNORE INTO questions 
-                    (id, title, difficulty, category, leetcode_id, day_number, session, description)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    leetcode_id,
+                rows[leetcode_id] = (
                     q_data.get('title', ''),
                     q_data.get('difficulty', 'Medium'),
                     q_data.get('category', 'Other'),
@@ -208,69 +621,891 @@ def populate_questions():
                     day_num,
                     session,
                     day_plan.get('description', '')
-                ))
+                )
+    return rows
+
+def sync_questions(c, rows):
+    """Apply only the inserts, updates and deletes needed to make questions match rows"""
+    c.execute('''
+        SELECT id, title, difficulty, category, leetcode_id, day_number, session, description
+        FROM questions
+    ''')
+    existing = {row[0]: tuple(row[1:]) for row in c.fetchall()}
     
-    conn.commit()
-    conn.close()
+    inserts = [(qid,) + row for qid, row in rows.items() if qid not in existing]
+    updates = [row + (qid,) for qid, row in rows.items() if qid in existing and existing[qid] != row]
+    deletes = [(qid,) for qid in existing if qid not in rows]
+    
+    c.executemany('''
+        INSERT INTO questions 
+        (id, title, difficulty, category, leetcode_id, day_number, session, description)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', inserts)
+    c.executemany('''
+        UPDATE questions
+        SET title = ?, difficulty = ?, category = ?, leetcode_id = ?,
+            day_number = ?, session = ?, description = ?
+        WHERE id = ?
+    ''', updates)
+    # Progress rows for deleted questions are kept as history
+    c.executemany('DELETE FROM questions WHERE id = ?', deletes)
+    return len(inserts), len(updates), len(deletes)
 
-def create_30_day_plan() -> Dict:
-    """Create a scientific 30-day study plan"""
-    plan = {}
+def materialize_daily_plans(c, study_plan):
+    """Write each day's static plan (description, focus, session buckets) to daily_plans.
     
-    # Days 1-5: Basic Data Structures
-    plan[1] = {
-        'description': 'Basic Data Structures - Arrays & Hash Tables',
-        'focus': 'Arrays & Hash Tables',
-        'sessions': {
-            'morning': [
-                {'id': 1, 'title': 'Two Sum'},
-                {'id': 217, 'title': 'Contains Duplicate'}
-            ],
-            'afternoon': [
-                {'id': 49, 'title': 'Group Anagrams'},
-                {'id': 238, 'title': 'Product of Array Except Self'},
-                {'id': 347, 'title': 'Top K Frequent Elements'}
-            ],
-            'evening': []
-        }
-    }
+    Session buckets hold the ids the questions table assigns to that day, in the
+    order build_plan serves them, so reads only overlay the user's progress.
+    """
+    c.execute('SELECT id, day_number, session FROM questions WHERE day_number IS NOT NULL')
+    buckets = {}
+    for qid, day, session in sorted(c.fetchall(), key=lambda r: (SESSION_ORDER.get(r[2], 4), r[0])):
+        buckets.setdefault(day, {name: [] for name in SESSION_ORDER}).setdefault(session, []).append(qid)
     
-    plan[2] = {
-        'description': 'Arrays & Hash Tables Advanced',
-        'focus': 'Arrays & Hash Tables',
-        'sessions': {
-            'morning': [
-                {'id': 36, 'title': 'Valid Sudoku'},
-                {'id': 128, 'title': 'Longest Consecutive Sequence'}
-            ],
-            'afternoon': [
-                {'id': 271, 'title': 'Encode and Decode Strings'},
-                {'id': 202, 'title': 'Happy Number'},
-                {'id': 66, 'title': 'Plus One'}
-            ],
-            'evening': []
-        }
-    }
+    c.executemany('''
+        INSERT INTO daily_plans (day_number, description, focus, sessions)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(day_number) DO UPDATE SET
+            description = excluded.description,
+            focus = excluded.focus,
+            sessions = excluded.sessions
+    ''', [(day, plan.get('description', ''), plan.get('focus', ''),
+           json.dumps(buckets.get(day, {name: [] for name in SESSION_ORDER})))
+          for day, plan in study_plan.items()])
+    c.execute(f'''
+        DELETE FROM daily_plans WHERE day_number NOT IN ({','.join('?' * len(study_plan))})
+    ''', list(study_plan))
+
+# Callbacks run after the question catalogue changes, used to drop derived caches
+catalogue_listeners = []
+
+def on_catalogue_change(listener):
+    """Register a function to call whenever the question catalogue is reloaded"""
+    catalogue_listeners.append(listener)
+    return listener
+
+# questions.json state last seen by this process
+_catalogue_lock = threading.Lock()
+_catalogue_state = {'checked_at': 0.0, 'mtime': None, 'hash': None}
+
+def reload_questions_if_changed(force=False):
+    """Re-import questions.json when it changed on disk; returns True if anything was reloaded"""
+    now = time.monotonic()
+    if not force and now - _catalogue_state['checked_at'] < CATALOGUE_CHECK_INTERVAL:
+        return False
     
-    plan[3] = {
-        'description': 'Two Pointers Basics',
-        'focus': 'Two Pointers',
-        'sessions': {
-            'morning': [
-                {'id': 125, 'title': 'Valid Palindrome'},
-                {'id': 11, 'title': 'Container With Most Water'}
-            ],
-            'afternoon': [
-                {'id': 15, 'title': '3Sum'},
-                {'id': 167, 'title': 'Two Sum II'},
-                {'id': 121, 'title': 'Best Time to Buy and Sell Stock'}
-            ],
-            'evening': []
+    with _catalogue_lock:
+        _catalogue_state['checked_at'] = now
+        try:
+            mtime = os.stat(QUESTIONS_FILE).st_mtime_ns
+        except OSError:
+            return False
+        if not force and mtime == _catalogue_state['mtime']:
+            return False
+        
+        file_hash = questions_file_hash()
+        _catalogue_state['mtime'] = mtime
+        if not force and file_hash == _catalogue_state['hash']:
+            return False
+        
+        with read_connection() as conn:
+            stored = conn.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?',
+                                  ('catalogue_hash',)).fetchone()
+        if not force and stored and stored[0] == file_hash:
+            # Already in the database: a fresh worker has nothing to do, and one that
+            # saw an older file only has stale caches (another worker applied it)
+            changed = _catalogue_state['hash'] is not None
+            _catalogue_state['hash'] = file_hash
+        else:
+            try:
+                study_plan = create_30_day_plan()
+                rows = build_question_rows(load_questions_data(), study_plan)
+            except (ValueError, KeyError) as e:
+                print(f"Warning: Ignoring invalid questions.json: {e}")
+                return False
+            
+            with writer_connection() as conn:
+                c = conn.cursor()
+                # Take the write lock first so only one worker applies a given version
+                c.execute('BEGIN IMMEDIATE')
+                c.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?', ('catalogue_hash',))
+                stored = c.fetchone()
+                applied = False
+                if force or not stored or stored[0] != file_hash:
+                    inserted, updated, deleted = sync_questions(c, rows)
+                    materialize_daily_plans(c, study_plan)
+                    c.execute('INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+                             ('catalogue_hash', file_hash))
+                    applied = bool(inserted or updated or deleted)
+                    if applied:
+                        print(f"Reloaded questions.json: {inserted} added, {updated} updated, {deleted} removed")
+                conn.commit()
+            
+            # Another worker may have applied the change already, our caches are stale either way
+            changed = applied or _catalogue_state['hash'] is not None
+            _catalogue_state['hash'] = file_hash
+    
+    if changed:
+        for listener in catalogue_listeners:
+            listener()
+    return changed
+
+# Order of sessions within a day
+SESSION_ORDER = {'morning': 1, 'afternoon': 2, 'evening': 3}
+
+class QuestionRecord:
+    """A catalogue entry; __slots__ and interned strings keep each record small"""
+    __slots__ = ('id', 'title', 'difficulty', 'category', 'leetcode_id',
+                 'day_number', 'session', 'description', 'tags', 'companies')
+    
+    def __init__(self, id, title, difficulty, category, leetcode_id, day_number,
+                 session, description, tags=(), companies=()):
+        self.id = id
+        self.title = title
+        self.difficulty = sys.intern(difficulty)
+        self.category = sys.intern(category)
+        self.leetcode_id = leetcode_id
+        self.day_number = day_number
+        self.session = sys.intern(session) if session else session
+        self.description = sys.intern(description) if description else description
+        self.tags = tuple(sys.intern(t) for t in tags)
+        self.companies = tuple(sys.intern(c) for c in companies)
+    
+    def to_dict(self) -> Dict:
+        """Same keys as a questions row, plus tag metadata"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'difficulty': self.difficulty,
+            'category': self.category,
+            'leetcode_id': self.leetcode_id,
+            'day_number': self.day_number,
+            'session': self.session,
+            'description': self.description,
+            'tags': list(self.tags),
+            'companies': list(self.companies)
         }
-    }
+
+class Catalogue:
+    """Read-only question catalogue with O(1) lookup by id and precomputed id lists"""
     
-    plan[4] = {
-        'description': 'Two Pointers Advanced',
+    def __init__(self, records: List[QuestionRecord], days: Optional[Dict[int, Dict]] = None,
+                 day_ids: Optional[Dict[int, List[int]]] = None):
+        self._days = days or {}
+        self._by_id = {r.id: r for r in records}
+        self._ids = tuple(sorted(self._by_id))
+        
+        by_category, by_difficulty, by_tag, by_day = {}, {}, {}, {}
+        for r in sorted(records, key=lambda r: (SESSION_ORDER.get(r.session, 4), r.id)):
+            by_category.setdefault(r.category, []).append(r.id)
+            by_difficulty.setdefault(r.difficulty, []).append(r.id)
+            for tag in r.tags:
+                by_tag.setdefault(tag, []).append(r.id)
+            if r.day_number is not None:
+                by_day.setdefault(r.day_number, []).append(r.id)
+        self._by_category = {k: tuple(v) for k, v in by_category.items()}
+        self._by_difficulty = {k: tuple(v) for k, v in by_difficulty.items()}
+        self._by_tag = {k: tuple(v) for k, v in by_tag.items()}
+        self._by_day = {k: tuple(v) for k, v in by_day.items()}
+        if day_ids:
+            # Materialized plan order wins over the derived one
+            self._by_day = {k: tuple(qid for qid in v if qid in self._by_id) for k, v in day_ids.items()}
+    
+    @classmethod
+    def from_db(cls, conn):
+        """Build from the questions table, with tags/companies from questions.json when present"""
+        metadata = {}
+        try:
+            for cat_data in load_questions_data()['categories'].values():
+                for q in cat_data['questions']:
+                    metadata[q['id']] = (q.get('tags', ()), q.get('companies', ()))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Catalogue loaded without tag metadata: {e}")
+        
+        c = conn.cursor()
+        days, day_ids = {}, {}
+        c.execute('SELECT day_number, description, focus, sessions FROM daily_plans')
+        for day, description, focus, sessions in c.fetchall():
+            days[day] = {'description': description, 'focus': focus}
+            buckets = json.loads(sessions)
+            day_ids[day] = [qid for name in sorted(buckets, key=lambda n: SESSION_ORDER.get(n, 4))
+                            for qid in buckets[name]]
+        if not days:
+            # Plans not materialized yet, fall back to the built-in plan
+            days = {day: {'description': plan['description'], 'focus': plan['focus']}
+                    for day, plan in create_30_day_plan().items()}
+        
+        c.execute('''
+            SELECT id, title, difficulty, category, leetcode_id, day_number, session, description
+            FROM questions
+        ''')
+        return cls([QuestionRecord(*row, *metadata.get(row[0], ((), ()))) for row in c.fetchall()], days, day_ids)
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    def __contains__(self, question_id):
+        return question_id in self._by_id
+    
+    def get(self, question_id) -> Optional[QuestionRecord]:
+        return self._by_id.get(question_id)
+    
+    def ids(self):
+        return self._ids
+    
+    def ids_for_category(self, category):
+        return self._by_category.get(category, ())
+    
+    def ids_for_difficulty(self, difficulty):
+        return self._by_difficulty.get(difficulty, ())
+    
+    def ids_for_tag(self, tag):
+        return self._by_tag.get(tag, ())
+    
+    def ids_for_day(self, day):
+        """Question ids for a study day, in session order"""
+        return self._by_day.get(day, ())
+    
+    def categories(self):
+        return list(self._by_category)
+    
+    def difficulties(self):
+        return list(self._by_difficulty)
+    
+    def tags(self):
+        return list(self._by_tag)
+    
+    def days(self):
+        return sorted(self._days)
+    
+    def day_info(self, day) -> Optional[Dict]:
+        """Plan metadata (description, focus) for a study day"""
+        return self._days.get(day)
+
+# Snapshot layout (little-endian): header, sorted int32 ids, fixed-size records,
+# index entries over a shared uint32 array of record positions, day entries, string table.
+# Strings are (offset, length) references into the string table.
+SNAPSHOT_MAGIC = b'LCPSNAP\x00'
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct('<8sI32s11I')
+SNAPSHOT_RECORD = struct.Struct('<ii14I')    # leetcode_id, day_number, 7 string refs
+SNAPSHOT_INDEX = struct.Struct('<Bxxxi4I')   # kind, int key, string key ref, first position, count
+SNAPSHOT_DAY = struct.Struct('<i4I')         # day, description ref, focus ref
+SNAPSHOT_NONE = 0xFFFFFFFF                   # string length marking None
+SNAPSHOT_LIST_SEPARATOR = '\x1f'
+INDEX_CATEGORY, INDEX_DIFFICULTY, INDEX_TAG, INDEX_DAY = range(4)
+
+def snapshot_key(catalogue_hash):
+    """Identify the catalogue contents a snapshot was compiled from"""
+    return hashlib.sha256(f'{catalogue_hash}:{DATA_VERSION}'.encode('utf-8')).digest()
+
+def write_catalogue_snapshot(catalogue: Catalogue, key: bytes, path=None):
+    """Compile a catalogue into a snapshot file, swapped in atomically by rename"""
+    path = path or SNAPSHOT_FILE
+    strings = bytearray()
+    string_refs = {}
+    
+    def ref(value):
+        if value is None:
+            return (0, SNAPSHOT_NONE)
+        if value not in string_refs:
+            encoded = value.encode('utf-8')
+            string_refs[value] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_refs[value]
+    
+    ids = catalogue.ids()
+    position = {qid: i for i, qid in enumerate(ids)}
+    
+    records = bytearray()
+    for qid in ids:
+        r = catalogue.get(qid)
+        records += SNAPSHOT_RECORD.pack(
+            r.leetcode_id if r.leetcode_id is not None else -1,
+            r.day_number if r.day_number is not None else -1,
+            *ref(r.title), *ref(r.difficulty), *ref(r.category), *ref(r.session),
+            *ref(r.description), *ref(SNAPSHOT_LIST_SEPARATOR.join(r.tags)),
+            *ref(SNAPSHOT_LIST_SEPARATOR.join(r.companies)))
+    
+    index_entries = bytearray()
+    positions = []
+    indexes = [
+        (INDEX_CATEGORY, catalogue.categories(), catalogue.ids_for_category),
+        (INDEX_DIFFICULTY, catalogue.difficulties(), catalogue.ids_for_difficulty),
+        (INDEX_TAG, catalogue.tags(), catalogue.ids_for_tag),
+        (INDEX_DAY, sorted({catalogue.get(qid).day_number for qid in ids} - {None}), catalogue.ids_for_day),
+    ]
+    n_index = 0
+    for kind, keys, lookup in indexes:
+        for index_key in keys:
+            members = lookup(index_key)
+            int_key, str_ref = ((index_key, (0, SNAPSHOT_NONE)) if kind == INDEX_DAY
+                                else (0, ref(index_key)))
+            index_entries += SNAPSHOT_INDEX.pack(kind, int_key, *str_ref, len(positions), len(members))
+            positions.extend(position[qid] for qid in members)
+            n_index += 1
+    
+    days = bytearray()
+    for day in catalogue.days():
+        info = catalogue.day_info(day)
+        days += SNAPSHOT_DAY.pack(day, *ref(info['description']), *ref(info['focus']))
+    
+    sections = [
+        struct.pack(f'<{len(ids)}i', *ids),
+        bytes(records),
+        bytes(index_entries),
+        struct.pack(f'<{len(positions)}I', *positions),
+        bytes(days),
+        bytes(strings),
+    ]
+    offsets = []
+    offset = SNAPSHOT_HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+    off_ids, off_records, off_index, off_positions, off_days, off_strings = offsets
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, key, len(ids), off_ids, off_records,
+        off_strings, len(strings), off_index, n_index, off_positions, len(positions),
+        off_days, len(catalogue.days()))
+    
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class SnapshotCatalogue:
+    """Catalogue read lazily from a memory-mapped snapshot; workers share its pages"""
+    
+    def __init__(self, path=None):
+        path = path or SNAPSHOT_FILE
+        if sys.byteorder != 'little':
+            raise ValueError('Snapshots are little-endian only')
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, self.key, n_records, off_ids, self._off_records, self._off_strings,
+         len_strings, off_index, n_index, off_positions, n_positions, off_days,
+         n_days) = SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+        if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+            raise ValueError(f'{path} is not a catalogue snapshot')
+        
+        view = memoryview(self._mm)
+        self._ids = view[off_ids:off_ids + 4 * n_records].cast('i')
+        self._positions = view[off_positions:off_positions + 4 * n_positions].cast('I')
+        # O(1) lookups: id -> record index, and records decoded once on first use
+        self._index_of = {qid: i for i, qid in enumerate(self._ids)}
+        self._records = {}
+        
+        # Only the small key -> (first, count) maps are materialized per worker
+        self._indexes = {INDEX_CATEGORY: {}, INDEX_DIFFICULTY: {}, INDEX_TAG: {}, INDEX_DAY: {}}
+        for i in range(n_index):
+            kind, int_key, key_off, key_len, first, count = SNAPSHOT_INDEX.unpack_from(
+                self._mm, off_index + i * SNAPSHOT_INDEX.size)
+            key = int_key if kind == INDEX_DAY else self._string(key_off, key_len)
+            self._indexes[kind][key] = (first, count)
+        
+        self._days = {}
+        for i in range(n_days):
+            day, desc_off, desc_len, focus_off, focus_len = SNAPSHOT_DAY.unpack_from(
+                self._mm, off_days + i * SNAPSHOT_DAY.size)
+            self._days[day] = {'description': self._string(desc_off, desc_len),
+                               'focus': self._string(focus_off, focus_len)}
+    
+    def _string(self, offset, length):
+        if length == SNAPSHOT_NONE:
+            return None
+        start = self._off_strings + offset
+        return self._mm[start:start + length].decode('utf-8')
+    
+    def _record(self, index) -> QuestionRecord:
+        fields = SNAPSHOT_RECORD.unpack_from(self._mm, self._off_records + index * SNAPSHOT_RECORD.size)
+        leetcode_id, day_number = fields[0], fields[1]
+        title, difficulty, category, session, description, tags, companies = (
+            self._string(fields[i], fields[i + 1]) for i in range(2, 16, 2))
+        return QuestionRecord(
+            self._ids[index], title, difficulty, category,
+            None if leetcode_id == -1 else leetcode_id,
+            None if day_number == -1 else day_number,
+            session, description,
+            tags.split(SNAPSHOT_LIST_SEPARATOR) if tags else (),
+            companies.split(SNAPSHOT_LIST_SEPARATOR) if companies else ())
+    
+    def _index_ids(self, kind, key):
+        first, count = self._indexes[kind].get(key, (0, 0))
+        return tuple(self._ids[p] for p in self._positions[first:first + count])
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    def __contains__(self, question_id):
+        return question_id in self._index_of
+    
+    def get(self, question_id) -> Optional[QuestionRecord]:
+        record = self._records.get(question_id)
+        if record is None:
+            i = self._index_of.get(question_id)
+            if i is None:
+                return None
+            record = self._records[question_id] = self._record(i)
+        return record
+    
+    def ids(self):
+        return tuple(self._ids)
+    
+    def ids_for_category(self, category):
+        return self._index_ids(INDEX_CATEGORY, category)
+    
+    def ids_for_difficulty(self, difficulty):
+        return self._index_ids(INDEX_DIFFICULTY, difficulty)
+    
+    def ids_for_tag(self, tag):
+        return self._index_ids(INDEX_TAG, tag)
+    
+    def ids_for_day(self, day):
+        """Question ids for a study day, in session order"""
+        return self._index_ids(INDEX_DAY, day)
+    
+    def categories(self):
+        return list(self._indexes[INDEX_CATEGORY])
+    
+    def difficulties(self):
+        return list(self._indexes[INDEX_DIFFICULTY])
+    
+    def tags(self):
+        return list(self._indexes[INDEX_TAG])
+    
+    def days(self):
+        return sorted(self._days)
+    
+    def day_info(self, day) -> Optional[Dict]:
+        """Plan metadata (description, focus) for a study day"""
+        return self._days.get(day)
+
+def load_catalogue():
+    """Map the shared snapshot if it matches the database, otherwise compile a fresh one"""
+    conn = acquire_read_connection()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?', ('catalogue_hash',))
+        result = c.fetchone()
+        key = snapshot_key(result[0] if result else None)
+        
+        try:
+            snapshot = SnapshotCatalogue(SNAPSHOT_FILE)
+            if snapshot.key == key:
+                _snapshot_state['stat'] = snapshot_stat()
+                return snapshot
+        except (OSError, ValueError, struct.error):
+            pass  # Missing, stale format or corrupt, rebuild below
+        
+        catalogue = Catalogue.from_db(conn)
+    finally:
+        release_read_connection(conn)
+    
+    try:
+        write_catalogue_snapshot(catalogue, key)
+    except OSError as e:
+        print(f"Warning: Failed to write catalogue snapshot: {e}")
+    # Serve the in-memory copy now; the next swap check maps the snapshot we just wrote
+    return catalogue
+
+def snapshot_stat():
+    """Identify the snapshot file currently at SNAPSHOT_FILE (None if missing)"""
+    try:
+        st = os.stat(SNAPSHOT_FILE)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+# Snapshot file this process has mapped, and when it last looked for a new one
+_snapshot_state = {'checked_at': 0.0, 'stat': None}
+
+_catalogue = None
+_catalogue_build_lock = threading.Lock()
+
+def get_catalogue() -> Catalogue:
+    """Get the in-process catalogue, building it on first use"""
+    global _catalogue
+    catalogue = _catalogue
+    if catalogue is None:
+        with _catalogue_build_lock:
+            if _catalogue is None:
+                _catalogue = load_catalogue()
+            catalogue = _catalogue
+    return catalogue
+
+@on_catalogue_change
+def invalidate_catalogue():
+    """Drop the in-process catalogue so the next request rebuilds it"""
+    global _catalogue
+    _catalogue = None
+
+@app.before_request
+def check_catalogue():
+    """Pick up questions.json edits and swapped-in snapshots without a restart"""
+    try:
+        reload_questions_if_changed()
+    except sqlite3.OperationalError as e:
+        print(f"Warning: Failed to reload questions: {e}")
+    
+    now = time.monotonic()
+    if now - _snapshot_state['checked_at'] >= CATALOGUE_CHECK_INTERVAL:
+        _snapshot_state['checked_at'] = now
+        stat = snapshot_stat()
+        if stat is not None and stat != _snapshot_state['stat']:
+            _snapshot_state['stat'] = stat
+            invalidate_catalogue()
+
+# Per-client token buckets for writes: route endpoint -> (tokens per second, burst).
+# Overridable with RATE_LIMITS, e.g. "default=5:20,apply_batch=1:5,update_note=off"
+DEFAULT_RATE_LIMITS = {
+    'default': (5.0, 20),
+    'apply_batch': (2.0, 10),
+    'create_practice_set': (1.0, 10),
+    'run_maintenance_tasks': (0.1, 2)
+}
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000'))
+# GET endpoints whose concurrent identical requests share one computation
+COALESCED_ROUTES = set(filter(None, os.environ.get('COALESCED_ROUTES', 'get_plan,get_statistics,get_review_list,get_analytics').split(',')))
+
+def parse_rate_limits(spec):
+    """Merge a RATE_LIMITS string over the defaults; 'off' disables a route"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        endpoint, _, value = item.partition('=')
+        if value == 'off':
+            limits[endpoint] = None
+            continue
+        try:
+            rate, burst = value.split(':')
+            limits[endpoint] = (float(rate), int(burst))
+        except ValueError:
+            print(f"Warning: ignoring invalid rate limit '{item}'")
+    return limits
+
+class TokenBucketLimiter:
+    """Token buckets keyed by (route, client), least recently used evicted past max_clients"""
+    
+    def __init__(self, limits, max_clients):
+        self.limits = limits
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def limit_for(self, endpoint):
+        return self.limits.get(endpoint, self.limits.get('default'))
+    
+    def acquire(self, endpoint, client):
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        limit = self.limit_for(endpoint)
+        if limit is None:
+            return 0
+        rate, burst = limit
+        key = (endpoint, client)
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else 60
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+rate_limiter = TokenBucketLimiter(parse_rate_limits(os.environ.get('RATE_LIMITS')), RATE_LIMIT_MAX_CLIENTS)
+
+def client_id():
+    """Identify the caller for rate limiting and coalescing"""
+    return request.remote_addr or 'unknown'
+
+# Responses to writes sent with an Idempotency-Key, replayed when the same key is retried
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', '10000'))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+class IdempotencyStore:
+    """Recent (client, key) -> response, evicted after ttl seconds or oldest-first past max_keys"""
+    
+    IN_FLIGHT = object()
+    
+    def __init__(self, ttl, max_keys):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def _expire(self, now):
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if entry['expires'] > now and len(self.entries) <= self.max_keys:
+                break
+            self.entries.popitem(last=False)
+    
+    def begin(self, key, fingerprint):
+        """Claim key for a new request; returns None, or the existing entry if it is taken"""
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry
+            self.entries[key] = {'expires': now + self.ttl, 'fingerprint': fingerprint,
+                                 'response': self.IN_FLIGHT}
+            self._expire(now)
+            return None
+    
+    def complete(self, key, response):
+        """Keep a finished response for replay"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry['response'] = response
+    
+    def release(self, key):
+        """Forget a claim whose request should be retryable (server error or crash)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['response'] is self.IN_FLIGHT:
+                del self.entries[key]
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
+
+@app.before_request
+def replay_idempotent_write():
+    """Answer a retried write from the stored response instead of applying it again"""
+    key = request.headers.get('Idempotency-Key')
+    if not key or request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+    
+    scoped_key = (client_id(), key)
+    fingerprint = hashlib.sha256(request.method.encode() + request.full_path.encode() + b'\0' +
+                                 request.get_data()).hexdigest()
+    entry = idempotency_store.begin(scoped_key, fingerprint)
+    if entry is None:
+        g.idempotency_key = scoped_key
+        return None
+    if entry['fingerprint'] != fingerprint:
+        return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different request'}), 422
+    if entry['response'] is IdempotencyStore.IN_FLIGHT:
+        response = jsonify({'success': False, 'error': 'A request with this Idempotency-Key is still in progress'})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    status, body, mimetype = entry['response']
+    response = app.response_class(body, status=status, mimetype=mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+@app.after_request
+def store_idempotent_response(response):
+    """Remember the outcome of a keyed write; server errors and 429s stay retryable"""
+    key = g.pop('idempotency_key', None)
+    if key is not None:
+        if response.status_code >= 500 or response.status_code == 429:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, (response.status_code, response.get_data(), response.mimetype))
+    return response
+
+@app.teardown_request
+def release_idempotency_key(exc):
+    key = g.pop('idempotency_key', None)
+    if key is not None:
+        idempotency_store.release(key)
+
+@app.before_request
+def limit_writes():
+    """Reject writes over the client's rate with 429 and Retry-After"""
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or request.endpoint is None:
+        return None
+    wait = rate_limiter.acquire(request.endpoint, client_id())
+    if wait:
+        response = jsonify({'success': False, 'error': 'Too many requests, slow down'})
+        response.headers['Retry-After'] = str(max(1, int(wait + 0.999)))
+        return response, 429
+    return None
+
+class SingleFlight:
+    """Run one computation per key at a time; callers arriving meanwhile get its result"""
+    
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+    
+    def do(self, key, fn):
+        """Returns (result, shared)"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event(), 'result': None, 'ok': False}
+        if not leader:
+            call['done'].wait()
+            if call['ok']:
+                return call['result'], True
+            # The leader failed; compute independently so each caller sees its own error
+            return fn(), False
+        try:
+            call['result'] = fn()
+            call['ok'] = True
+            return call['result'], False
+        finally:
+            # Only in-flight keys are held, so memory is bounded by concurrent requests
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+
+read_flights = SingleFlight()
+# Bumped after every write request so a read never joins a flight that started before it
+_write_counter = itertools.count(1)
+_write_generation = 0
+
+@app.after_request
+def advance_write_generation(response):
+    global _write_generation
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        _write_generation = next(_write_counter)
+    return response
+
+def coalesce_reads(view):
+    """Share one response between concurrent identical GETs from the same client"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.endpoint not in COALESCED_ROUTES:
+            return view(*args, **kwargs)
+        key = (request.endpoint, request.full_path, client_id(), _write_generation)
+        response, shared = read_flights.do(key, lambda: app.make_response(view(*args, **kwargs)))
+        if not shared:
+            return response
+        # Each follower gets its own copy of the leader's response
+        copy = app.response_class(response.get_data(), status=response.status_code, headers=response.headers)
+        copy.headers['X-Coalesced'] = '1'
+        return copy
+    return wrapper
+
+def update_categories(c):
+    """Update category names from Chinese to English"""
+    category_mapping = {
+        '数组和哈希表': 'Arrays & Hash Tables',
+        '双指针': 'Two Pointers',
+        '滑动窗口': 'Sliding Window',
+        '栈': 'Stack',
+        '二分查找': 'Binary Search',
+        '链表': 'Linked List',
+        '树': 'Tree',
+        '堆/优先队列': 'Heap / Priority Queue',
+        '回溯': 'Backtracking',
+        '图': 'Graph',
+        '动态规划': 'Dynamic Programming',
+        '贪心': 'Greedy',
+        '区间': 'Intervals',
+        '数学': 'Math',
+        '位运算': 'Bit Manipulation',
+        '其他': 'Other'
+    }
+    
+    # One indexed pass instead of an UPDATE per category
+    cases = ' '.join('WHEN ? THEN ?' for _ in category_mapping)
+    placeholders = ','.join('?' * len(category_mapping))
+    params = [value for pair in category_mapping.items() for value in pair]
+    c.execute(f'''
+        UPDATE questions 
+        SET category = CASE category {cases} END
+        WHERE category IN ({placeholders})
+    ''', params + list(category_mapping))
+    print(f"Updated {c.rowcount} question categories to English")
+
+def populate_questions():
+    """Import questions data into database"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    
+    # Check if data already exists
+    c.execute('SELECT COUNT(*) FROM questions')
+    if c.fetchone()[0] > 0:
+        # Update existing categories to English
+        update_categories(c)
+        materialize_daily_plans(c, create_30_day_plan())
+    else:
+        # Insert questions and assign to days
+        study_plan = create_30_day_plan()
+        sync_questions(c, build_question_rows(load_questions_data(), study_plan))
+        materialize_daily_plans(c, study_plan)
+        c.execute('INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+                 ('catalogue_hash', questions_file_hash()))
+    
+    c.execute('INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+             ('data_version', str(DATA_VERSION)))
+    conn.commit()
+    conn.close()
+
+def create_30_day_plan() -> Dict:
+    """Create a scientific 30-day study plan"""
+    plan = {}
+    
+    # Days 1-5: Basic Data Structures
+    plan[1] = {
+        'description': 'Basic Data Structures - Arrays & Hash Tables',
+        'focus': 'Arrays & Hash Tables',
+        'sessions': {
+            'morning': [
+                {'id': 1, 'title': 'Two Sum'},
+                {'id': 217, 'title': 'Contains Duplicate'}
+            ],
+            'afternoon': [
+                {'id': 49, 'title': 'Group Anagrams'},
+                {'id': 238, 'title': 'Product of Array Except Self'},
+                {'id': 347, 'title': 'Top K Frequent Elements'}
+            ],
+            'evening': []
+        }
+    }
+    
+    plan[2] = {
+        'description': 'Arrays & Hash Tables Advanced',
+        'focus': 'Arrays & Hash Tables',
+        'sessions': {
+            'morning': [
+                {'id': 36, 'title': 'Valid Sudoku'},
+                {'id': 128, 'title': 'Longest Consecutive Sequence'}
+            ],
+            'afternoon': [
+                {'id': 271, 'title': 'Encode and Decode Strings'},
+                {'id': 202, 'title': 'Happy Number'},
+                {'id': 66, 'title': 'Plus One'}
+            ],
+            'evening': []
+        }
+    }
+    
+    plan[3] = {
+        'description': 'Two Pointers Basics',
+        'focus': 'Two Pointers',
+        'sessions': {
+            'morning': [
+                {'id': 125, 'title': 'Valid Palindrome'},
+                {'id': 11, 'title': 'Container With Most Water'}
+            ],
+            'afternoon': [
+                {'id': 15, 'title': '3Sum'},
+                {'id': 167, 'title': 'Two Sum II'},
+                {'id': 121, 'title': 'Best Time to Buy and Sell Stock'}
+            ],
+            'evening': []
+        }
+    }
+    
+    plan[4] = {
+        'description': 'Two Pointers Advanced',
         'focus': 'Two Pointers',
         'sessions': {
             'morning': [
@@ -741,327 +1976,298 @@ def index():
     """Home page"""
     return render_template('index.html')
 
-def get_start_date():
-    """Get the start date from database"""
-    conn = get_db_connection()
+# Dates are also kept as epoch days (days since 1970-01-01) for integer day math
+EPOCH_DATE = date(1970, 1, 1)
+# SQL for the epoch day of a YYYY-MM-DD column or parameter (NULL stays NULL)
+EPOCH_DAY_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+def epoch_day(day: date) -> int:
+    return (day - EPOCH_DATE).days
+
+def from_epoch_day(days: int) -> date:
+    return EPOCH_DATE + timedelta(days=days)
+
+def parse_timezone(name):
+    """ZoneInfo for an IANA name like 'Europe/Berlin'; raises ValueError if unknown"""
     try:
-        c = conn.cursor()
-        c.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?', ('start_date',))
-        result = c.fetchone()
-        if result:
-            return datetime.strptime(result[0], '%Y-%m-%d').date()
-        else:
-            today = datetime.now().date()
-            # Save it
-            c.execute('INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
-                     ('start_date', today.isoformat()))
-            conn.commit()
-            return today
-    finally:
-        conn.close()
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f'Unknown timezone: {name}') from e
+
+def get_user_timezone():
+    """The learner's timezone from settings, or None to use the server's local time.
+    
+    Read once per request and kept on g; set_timezone_setting drops it.
+    """
+    if has_request_context() and 'user_timezone' in g:
+        return g.user_timezone
+    with closing(get_storage()) as store:
+        name = store.get_setting('timezone')
+    zone = None
+    if name:
+        try:
+            zone = parse_timezone(name)
+        except ValueError as e:
+            print(f"Warning: {e}, using server time")
+    if has_request_context():
+        g.user_timezone = zone
+    return zone
+
+def user_today() -> date:
+    """Today's date where the learner is"""
+    return datetime.now(get_user_timezone()).date()
+
+def get_start_date():
+    """Get the start date from storage, saving today's the first time"""
+    with closing(get_storage()) as store:
+        value = store.get_setting('start_date')
+    if value:
+        return date.fromisoformat(value)
+    today = user_today()
+    with writer_connection() as conn:
+        with closing(get_storage(conn)) as store:
+            with store.transaction():
+                # Another request may have saved one in the meantime
+                value = store.get_setting('start_date')
+                if not value:
+                    store.set_setting('start_date', today.isoformat())
+    return date.fromisoformat(value) if value else today
 
 def get_current_day():
-    """Calculate current day based on start date"""
-    start_date = get_start_date()
-    today = datetime.now().date()
-    days_passed = (today - start_date).days + 1
+    """Calculate current day based on start date, in the learner's timezone"""
+    days_passed = epoch_day(user_today()) - epoch_day(get_start_date()) + 1
     return min(max(1, days_passed), 30)
 
 @app.route('/api/current-day', methods=['GET'])
 def get_current_day_api():
     """Get current day number"""
-    current_day = get_current_day()
     start_date = get_start_date()
-    today = datetime.now().date()
+    today = user_today()
+    days_passed = epoch_day(today) - epoch_day(start_date)
     
     return jsonify({
-        'current_day': current_day,
+        'current_day': min(max(1, days_passed + 1), 30),
         'start_date': start_date.isoformat(),
         'today': today.isoformat(),
-        'days_passed': (today - start_date).days
+        'days_passed': days_passed
+    })
+
+@app.route('/api/settings/timezone', methods=['GET'])
+def get_timezone_setting():
+    """Get the timezone that decides when a study day starts"""
+    with closing(get_storage()) as store:
+        name = store.get_setting('timezone')
+    return jsonify({'timezone': name, 'today': user_today().isoformat()})
+
+@app.route('/api/settings/timezone', methods=['POST'])
+def set_timezone_setting():
+    """Set the timezone, e.g. {"timezone": "America/New_York"}"""
+    data = request.get_json(silent=True) or {}
+    name = data.get('timezone')
+    if not isinstance(name, str) or not name:
+        return jsonify({'success': False, 'error': 'timezone is required'}), 400
+    try:
+        parse_timezone(name)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        with writer_connection() as conn:
+            with closing(get_storage(conn)) as store:
+                with store.transaction():
+                    store.set_setting('timezone', name)
+        g.pop('user_timezone', None)
+        return jsonify({'success': True, 'timezone': name, 'today': user_today().isoformat()})
+    except Exception as e:
+        print(f"Error setting timezone: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/questions', methods=['GET'])
+def list_questions():
+    """List catalogue questions filtered by category, difficulty, tag and day"""
+    catalogue = get_catalogue()
+    
+    # Intersect the precomputed id lists for every filter given
+    selected = None
+    filters = [
+        (request.args.getlist('category'), catalogue.ids_for_category),
+        (request.args.getlist('difficulty'), catalogue.ids_for_difficulty),
+        (request.args.getlist('tag'), catalogue.ids_for_tag),
+        (request.args.getlist('day', type=int), catalogue.ids_for_day),
+    ]
+    for values, lookup in filters:
+        if values:
+            matching = set()
+            for value in values:
+                matching.update(lookup(value))
+            selected = matching if selected is None else selected & matching
+    
+    ids = catalogue.ids() if selected is None else sorted(selected)
+    return jsonify({
+        'total': len(ids),
+        'questions': [catalogue.get(qid).to_dict() for qid in ids]
     })
 
 @app.route('/api/plan/<int:day>', methods=['GET'])
+@coalesce_reads
 def get_plan(day):
     """Get study plan for specified day"""
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    catalogue = get_catalogue()
+    with read_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        # The nightly job precomputes today's plan; fall back to building it live
+        plan = load_plan_bundle(c, day)
+        if plan is None:
+            plan = build_plan(c, day, catalogue)
+    # The connection is back in the pool before the response is serialized
+    return jsonify(plan)
+
+def build_plan(c, day, catalogue):
+    """Overlay the user's progress on a day's materialized plan using an open read cursor"""
+    day_ids = list(catalogue.ids_for_day(day))
+    prev_ids = list(catalogue.ids_for_day(day - 1)) if day > 1 else []
+    progress = get_plan_progress(c, day_ids + prev_ids)
+    deferred_ids = {qid for qid in day_ids if qid in progress and progress[qid]['deferred']}
     
-    # Get all questions for this day
-    c.execute('''
-        SELECT * FROM questions 
-        WHERE day_number = ?
-        ORDER BY 
-            CASE session
-                WHEN 'morning' THEN 1
-                WHEN 'afternoon' THEN 2
-                WHEN 'evening' THEN 3
-                ELSE 4
-            END
-    ''', (day,))
-    
-    questions = [dict(row) for row in c.fetchall()]
-    
-    # Get deferred questions for this day (exclude them from normal display)
-    deferred_question_ids = set()
-    if questions:
-        question_ids = [q['id'] for q in questions]
-        placeholders = ','.join('?' * len(question_ids))
-        c.execute(f'''
-            SELECT question_id FROM progress 
-            WHERE question_id IN ({placeholders}) AND deferred = 1
-        ''', question_ids)
-        deferred_question_ids = {row[0] for row in c.fetchall()}
-    
-    # Filter out deferred questions from the main list
-    questions = [q for q in questions if q['id'] not in deferred_question_ids]
-    
-    # Get completion status and notes for this day's questions
-    completed_ids = set()
-    wrong_ids = set()
-    question_notes = {}
-    if questions:
-        question_ids = [q['id'] for q in questions]
-        placeholders = ','.join('?' * len(question_ids))
-        c.execute(f'''
-            SELECT question_id, is_correct, notes FROM progress 
-            WHERE question_id IN ({placeholders})
-        ''', question_ids)
-        for row in c.fetchall():
-            completed_ids.add(row[0])
-            if not row[1]:
-                wrong_ids.add(row[0])
-            if row[2]:  # notes
-                question_notes[row[0]] = row[2]
-    
-    # Get incomplete questions from previous day (if day > 1)
-    incomplete_from_previous = []
-    if day > 1:
-        prev_day = day - 1
-        c.execute('''
-            SELECT * FROM questions 
-            WHERE day_number = ?
-        ''', (prev_day,))
-        prev_questions = [dict(row) for row in c.fetchall()]
-        
-        if prev_questions:
-            prev_question_ids = [q['id'] for q in prev_questions]
-            placeholders = ','.join('?' * len(prev_question_ids))
-            c.execute(f'''
-                SELECT question_id FROM progress 
-                WHERE question_id IN ({placeholders})
-            ''', prev_question_ids)
-            prev_completed = {row[0] for row in c.fetchall()}
-            
-            # Get incomplete questions from previous day (exclude deferred ones)
-            for q in prev_questions:
-                if q['id'] not in prev_completed and q['id'] not in deferred_question_ids:
-                    q_dict = dict(q)
-                    q_dict['completed'] = False
-                    q_dict['is_correct'] = None
-                    q_dict['from_previous_day'] = True
-                    incomplete_from_previous.append(q_dict)
-    
-    # Get review questions based on Ebbinghaus forgetting curve
-    review_questions_for_today = []
-    review_intervals = [1, 3, 7, 14]
-    today = datetime.now().date()
-    
-    # Calculate the actual date for this study day
-    start_date = get_start_date()
-    study_date = start_date + timedelta(days=day - 1)
+    sessions = {
+        'morning': [],
+        'afternoon': [],
+        'evening': []
+    }
     
-    # Get questions that should be reviewed today based on forgetting curve (exclude deferred)
-    today = datetime.now().date()
-    for interval in review_intervals:
-        target_completion_date = study_date - timedelta(days=interval)
-        c.execute('''
-            SELECT q.*, p.completed_date, p.is_correct, p.review_count, p.notes, p.last_review_date
-            FROM questions q
-            JOIN progress p ON q.id = p.question_id
-            WHERE p.completed_date = ? AND (p.deferred IS NULL OR p.deferred = 0)
-            ORDER BY p.is_correct ASC, p.review_count ASC
-        ''', (target_completion_date,))
-        
-        for row in c.fetchall():
-            q_dict = dict(row)
-            # Check if this review was completed today
-            last_review_date = row['last_review_date']
-            if last_review_date:
-                if isinstance(last_review_date, str):
-                    last_review_date = datetime.strptime(last_review_date, '%Y-%m-%d').date()
-                elif isinstance(last_review_date, datetime):
-                    last_review_date = last_review_date.date()
-                # If reviewed today, mark as completed
-                q_dict['completed'] = (last_review_date == today)
-            else:
-                # Check if completed_date is today (first time completing review)
-                completed_date = row['completed_date']
-                if completed_date:
-                    if isinstance(completed_date, str):
-                        completed_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                    elif isinstance(completed_date, datetime):
-                        completed_date = completed_date.date()
-                    q_dict['completed'] = (completed_date == today)
-                else:
-                    q_dict['completed'] = False
-            
-            q_dict['is_correct'] = row['is_correct']
-            q_dict['from_previous_day'] = False
-            q_dict['for_review'] = True
-            q_dict['review_interval'] = interval
-            q_dict['note'] = row['notes'] if row['notes'] else ''
-            review_questions_for_today.append(q_dict)
-    
-    # If no questions match exact intervals, get recently wrong questions (exclude deferred)
-    if not review_questions_for_today:
-        c.execute('''
-            SELECT q.*, p.completed_date, p.is_correct, p.review_count, p.notes, p.last_review_date
-            FROM questions q
-            JOIN progress p ON q.id = p.question_id
-            WHERE p.is_correct = 0
-            AND p.completed_date < ?
-            AND (p.deferred IS NULL OR p.deferred = 0)
-            ORDER BY p.completed_date DESC, p.review_count ASC
-            LIMIT 3
-        ''', (study_date,))
-        
-        for row in c.fetchall():
-            q_dict = dict(row)
-            # Check if reviewed today
-            last_review_date = row['last_review_date']
-            if last_review_date:
-                if isinstance(last_review_date, str):
-                    last_review_date = datetime.strptime(last_review_date, '%Y-%m-%d').date()
-                elif isinstance(last_review_date, datetime):
-                    last_review_date = last_review_date.date()
-                q_dict['completed'] = (last_review_date == today)
-            else:
-                completed_date = row['completed_date']
-                if completed_date:
-                    if isinstance(completed_date, str):
-                        completed_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                    elif isinstance(completed_date, datetime):
-                        completed_date = completed_date.date()
-                    q_dict['completed'] = (completed_date == today)
-                else:
-                    q_dict['completed'] = False
-            q_dict['is_correct'] = row['is_correct']
-            q_dict['from_previous_day'] = False
-            q_dict['for_review'] = True
-            q_dict['review_interval'] = None
-            q_dict['note'] = row['notes'] if row['notes'] else ''
-            review_questions_for_today.append(q_dict)
-    
-    # If still no review questions, get recently completed ones (exclude deferred)
-    if not review_questions_for_today:
-        c.execute('''
-            SELECT q.*, p.completed_date, p.is_correct, p.review_count, p.notes, p.last_review_date
-            FROM questions q
-            JOIN progress p ON q.id = p.question_id
-            WHERE p.completed_date < ?
-            AND (p.deferred IS NULL OR p.deferred = 0)
-            ORDER BY p.completed_date DESC, p.review_count ASC
-            LIMIT 3
-        ''', (study_date,))
-        
-        for row in c.fetchall():
-            q_dict = dict(row)
-            # Check if reviewed today
-            last_review_date = row['last_review_date']
-            if last_review_date:
-                if isinstance(last_review_date, str):
-                    last_review_date = datetime.strptime(last_review_date, '%Y-%m-%d').date()
-                elif isinstance(last_review_date, datetime):
-                    last_review_date = last_review_date.date()
-                q_dict['completed'] = (last_review_date == today)
-            else:
-                completed_date = row['completed_date']
-                if completed_date:
-                    if isinstance(completed_date, str):
-                        completed_date = datetime.strptime(completed_date, '%Y-%m-%d').date()
-                    elif isinstance(completed_date, datetime):
-                        completed_date = completed_date.date()
-                    q_dict['completed'] = (completed_date == today)
-                else:
-                    q_dict['completed'] = False
-            q_dict['is_correct'] = row['is_correct']
-            q_dict['from_previous_day'] = False
-            q_dict['for_review'] = True
-            q_dict['review_interval'] = None
-            q_dict['note'] = row['notes'] if row['notes'] else ''
-            review_questions_for_today.append(q_dict)
-    
-    # Remove duplicates (in case a question appears multiple times)
-    seen_ids = set()
-    unique_review_questions = []
-    for q in review_questions_for_today:
-        if q['id'] not in seen_ids:
-            seen_ids.add(q['id'])
-            unique_review_questions.append(q)
-    review_questions_for_today = unique_review_questions[:3]  # Max 3 review questions
-    
-    # Get plan info for this day
-    c.execute('SELECT * FROM daily_plans WHERE day_number = ?', (day,))
-    plan_info = c.fetchone()
-    
-    # Organize data
-    sessions = {
-        'morning': [],
-        'afternoon': [],
-        'evening': []
-    }
+    # Carry the previous day's unfinished questions (not deferred) into the morning
+    from_previous = 0
+    for qid in prev_ids:
+        row = progress.get(qid)
+        if row and (row['completed_date'] or row['deferred']):
+            continue
+        q_dict = catalogue.get(qid).to_dict()
+        q_dict['completed'] = False
+        q_dict['is_correct'] = None
+        q_dict['from_previous_day'] = True
+        q_dict['for_review'] = False
+        q_dict['note'] = (row['notes'] if row else None) or ''
+        sessions['morning'].append(q_dict)
+        from_previous += 1
     
-    # Add incomplete questions from previous day to morning session
-    for q in incomplete_from_previous:
-        # Get note if exists
-        c.execute('SELECT notes FROM progress WHERE question_id = ?', (q['id'],))
-        note_result = c.fetchone()
-        q['note'] = note_result[0] if note_result and note_result[0] else ''
-        q['from_previous_day'] = True
-        sessions['morning'].append(q)
-    
-    # Add today's questions
-    for q in questions:
-        q_dict = dict(q)
-        q_dict['completed'] = q['id'] in completed_ids
-        q_dict['is_correct'] = q['id'] not in wrong_ids if q['id'] in completed_ids else None
+    # Today's questions, deferred ones excluded
+    total_today = completed = wrong = 0
+    for qid in day_ids:
+        if qid in deferred_ids:
+            continue
+        row = progress.get(qid)
+        done = bool(row and row['completed_date'])
+        q_dict = catalogue.get(qid).to_dict()
+        q_dict['completed'] = done
+        q_dict['is_correct'] = bool(row['is_correct']) if done else None
         q_dict['from_previous_day'] = False
         q_dict['for_review'] = False
-        q_dict['note'] = question_notes.get(q['id'], '')
-        sessions[q['session']].append(q_dict)
+        q_dict['note'] = (row['notes'] if row else None) or ''
+        sessions[q_dict['session']].append(q_dict)
+        total_today += 1
+        if done:
+            completed += 1
+            if not row['is_correct']:
+                wrong += 1
+    
+    # Review questions go to the evening
+    review_questions = get_review_questions(c, day)
+    sessions['evening'].extend(review_questions)
+    
+    day_info = catalogue.day_info(day)
+    
+    return {
+        'day': day,
+        'sessions': sessions,
+        'plan_info': dict(day_info, day_number=day) if day_info else None,
+        'statistics': {
+            'total': total_today + from_previous + len(review_questions),
+            'completed': completed,
+            'wrong': wrong,
+            'from_previous': from_previous,
+            'for_review': len(review_questions),
+            'deferred': len(deferred_ids)
+        }
+    }
+
+def get_plan_progress(c, question_ids):
+    """Progress rows for the given questions, keyed by question id"""
+    if not question_ids:
+        return {}
+    placeholders = ','.join('?' * len(question_ids))
+    c.execute(f'''
+        SELECT question_id, is_correct, notes, completed_date, deferred FROM progress
+        WHERE question_id IN ({placeholders})
+    ''', question_ids)
+    return {row[0]: {'is_correct': row[1], 'notes': row[2], 'completed_date': row[3], 'deferred': row[4]}
+            for row in c.fetchall()}
+
+MAX_PLAN_REVIEWS = 3
+
+def review_entry(row, interval, today_day):
+    """A review question dict; it counts as done once reviewed (or first completed) today"""
+    q_dict = dict(row)
+    q_dict['completed'] = (row['last_review_day'] or row['completed_day']) == today_day
+    q_dict['is_correct'] = row['is_correct']
+    q_dict['from_previous_day'] = False
+    q_dict['for_review'] = True
+    q_dict['review_interval'] = interval
+    q_dict['note'] = row['notes'] if row['notes'] else ''
+    return q_dict
+
+def get_review_questions(c, day):
+    """Up to MAX_PLAN_REVIEWS questions to review on a study day, following the forgetting curve.
     
-    # Add review questions to evening session
-    for q in review_questions_for_today:
-        # Get note if exists
-        c.execute('SELECT notes FROM progress WHERE question_id = ?', (q['id'],))
-        note_result = c.fetchone()
-        q['note'] = note_result[0] if note_result and note_result[0] else ''
-        sessions['evening'].append(q)
+    Questions completed exactly one review interval before the study date come
+    first; without any, recent wrong answers, then recent completions, stand in.
+    Deferred questions are never reviewed.
+    """
+    study_day = epoch_day(get_start_date()) + day - 1
+    today_day = epoch_day(user_today())
+    select = '''
+        SELECT q.*, p.completed_date, p.is_correct, p.review_count, p.notes, p.last_review_date,
+               p.completed_day, p.last_review_day
+        FROM questions q
+        JOIN progress p ON q.id = p.question_id
+    '''
     
-    total_questions = len(questions) + len(incomplete_from_previous) + len(review_questions_for_today)
-    total_completed = len(completed_ids)
+    interval_by_day = {study_day - i: i for i in REVIEW_INTERVALS}
+    placeholders = ','.join('?' * len(interval_by_day))
+    c.execute(select + f'''
+        WHERE p.completed_day IN ({placeholders}) AND (p.deferred IS NULL OR p.deferred = 0)
+        ORDER BY p.is_correct ASC, p.review_count ASC
+    ''', list(interval_by_day))
+    rows = [(interval_by_day[row['completed_day']], row) for row in c.fetchall()]
+    # Shortest interval first, keeping the is_correct/review_count order within each
+    rows.sort(key=lambda item: REVIEW_INTERVALS.index(item[0]))
+    candidates = [review_entry(row, interval, today_day) for interval, row in rows]
     
-    # Get count of deferred questions for this day
-    deferred_count = len(deferred_question_ids)
+    for fallback in ('p.is_correct = 0 AND', ''):
+        if candidates:
+            break
+        c.execute(select + f'''
+            WHERE {fallback} p.completed_day < ? AND (p.deferred IS NULL OR p.deferred = 0)
+            ORDER BY p.completed_day DESC, p.review_count ASC
+            LIMIT ?
+        ''', (study_day, MAX_PLAN_REVIEWS))
+        candidates = [review_entry(row, None, today_day) for row in c.fetchall()]
     
-    try:
-        return jsonify({
-            'day': day,
-            'sessions': sessions,
-            'plan_info': dict(plan_info) if plan_info else None,
-            'statistics': {
-                'total': total_questions,
-                'completed': total_completed,
-                'wrong': len(wrong_ids),
-                'from_previous': len(incomplete_from_previous),
-                'for_review': len(review_questions_for_today),
-                'deferred': deferred_count
-            }
-        })
-    finally:
-        conn.close()
+    # Progress has one row per question, but keep the first of any duplicates
+    unique = {}
+    for q_dict in candidates:
+        unique.setdefault(q_dict['id'], q_dict)
+    return list(unique.values())[:MAX_PLAN_REVIEWS]
+
+def apply_defer(c, question_id):
+    """Mark a question as deferred using an open cursor (caller commits)"""
+    with closing(get_storage(c.connection)) as store:
+        store.save_progress(question_id, deferred=1, deferred_date=user_today().isoformat())
+
+def apply_undefer(c, question_id):
+    """Remove deferred status using an open cursor (caller commits)"""
+    with closing(get_storage(c.connection)) as store:
+        if store.get_progress(question_id):
+            store.save_progress(question_id, deferred=0, deferred_date=None)
 
 @app.route('/api/defer', methods=['POST'])
 def defer_question():
@@ -1075,32 +2281,11 @@ def defer_question():
         if question_id is None:
             return jsonify({'success': False, 'error': 'question_id is required'}), 400
         
-        conn = get_db_connection()
-        try:
+        with writer_connection() as conn:
             c = conn.cursor()
-            
-            # Check if progress entry exists
-            c.execute('SELECT id FROM progress WHERE question_id = ?', (question_id,))
-            existing = c.fetchone()
-            
-            if existing:
-                # Update existing entry
-                c.execute('''
-                    UPDATE progress 
-                    SET deferred = 1, deferred_date = ?
-                    WHERE question_id = ?
-                ''', (datetime.now().date(), question_id))
-            else:
-                # Create new entry with deferred status
-                c.execute('''
-                    INSERT INTO progress (question_id, deferred, deferred_date)
-                    VALUES (?, 1, ?)
-                ''', (question_id, datetime.now().date()))
-            
+            apply_defer(c, question_id)
             conn.commit()
-            return jsonify({'success': True})
-        finally:
-            conn.close()
+        return jsonify({'success': True})
     except Exception as e:
         print(f"Error deferring question: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1117,61 +2302,82 @@ def undefer_question():
         if question_id is None:
             return jsonify({'success': False, 'error': 'question_id is required'}), 400
         
-        conn = get_db_connection()
-        try:
+        with writer_connection() as conn:
             c = conn.cursor()
-            c.execute('''
-                UPDATE progress 
-                SET deferred = 0, deferred_date = NULL
-                WHERE question_id = ?
-            ''', (question_id,))
+            apply_undefer(c, question_id)
             conn.commit()
-            return jsonify({'success': True})
-        finally:
-            conn.close()
+        return jsonify({'success': True})
     except Exception as e:
         print(f"Error undeffering question: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Page size limits for the cursor-paginated list endpoints
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor')
+    return values
+
+def get_page_size():
+    """Read the limit query parameter, clamped to MAX_PAGE_SIZE"""
+    return min(max(1, request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)), MAX_PAGE_SIZE)
+
 @app.route('/api/deferred', methods=['GET'])
 def get_deferred_questions():
-    """Get all deferred questions"""
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    """Get deferred questions, newest first, one keyset page at a time"""
+    limit = get_page_size()
+    try:
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    store = get_storage()
     try:
-        c.execute('''
-            SELECT q.*, p.deferred_date, p.completed_date, p.is_correct
-            FROM questions q
-            JOIN progress p ON q.id = p.question_id
-            WHERE p.deferred = 1
-            ORDER BY p.deferred_date DESC, q.day_number ASC
-        ''')
+        after = (cursor.get('deferred_date'), cursor.get('id')) if cursor else None
+        rows = store.list_deferred(limit + 1, after)
         
         deferred_questions = []
-        for row in c.fetchall():
+        for row in rows[:limit]:
             q_dict = dict(row)
+            del q_dict['progress_id']
             q_dict['completed'] = row['completed_date'] is not None
-            q_dict['is_correct'] = row['is_correct']
             deferred_questions.append(q_dict)
         
-        return jsonify(deferred_questions)
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor({'deferred_date': last['deferred_date'], 'id': last['progress_id']})
+        
+        return jsonify({'items': deferred_questions, 'next_cursor': next_cursor})
     finally:
-        conn.close()
+        store.close()
 
 @app.route('/api/note/<int:question_id>', methods=['GET'])
 def get_note(question_id):
     """Get note for a question"""
-    conn = get_db_connection()
+    store = get_storage()
     try:
-        c = conn.cursor()
-        c.execute('SELECT notes FROM progress WHERE question_id = ?', (question_id,))
-        result = c.fetchone()
-        note = result[0] if result and result[0] else ''
+        progress = store.get_progress(question_id)
+        note = progress['notes'] if progress and progress['notes'] else ''
         return jsonify({'note': note})
     finally:
-        conn.close()
+        store.close()
+
+def apply_note(c, question_id, note):
+    """Save a note using an open cursor (caller commits)"""
+    with closing(get_storage(c.connection)) as store:
+        store.save_progress(question_id, notes=note)
 
 @app.route('/api/note/<int:question_id>', methods=['POST'])
 def update_note(question_id):
@@ -1180,35 +2386,256 @@ def update_note(question_id):
         data = request.json
         note = data.get('note', '')
         
-        conn = get_db_connection()
-        try:
+        with writer_connection() as conn:
             c = conn.cursor()
-            
-            # Check if progress entry exists
-            c.execute('SELECT id FROM progress WHERE question_id = ?', (question_id,))
-            existing = c.fetchone()
-            
-            if existing:
-                c.execute('''
-                    UPDATE progress 
-                    SET notes = ?
-                    WHERE question_id = ?
-                ''', (note, question_id))
-            else:
-                # Create new entry with note
-                c.execute('''
-                    INSERT INTO progress (question_id, notes)
-                    VALUES (?, ?)
-                ''', (question_id, note))
-            
+            apply_note(c, question_id, note)
             conn.commit()
-            return jsonify({'success': True})
-        finally:
-            conn.close()
+        return jsonify({'success': True})
     except Exception as e:
         print(f"Error updating note: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Oldest client timestamp honoured on a replayed offline mutation; older ones count as that old
+MAX_MUTATION_AGE = timedelta(days=int(os.environ.get('MAX_MUTATION_AGE_DAYS', '7')))
+
+def parse_client_time(value):
+    """Parse a mutation's ISO 'at' timestamp into UTC, clamped to the last MAX_MUTATION_AGE.
+    
+    None means now; raises ValueError if malformed. Naive timestamps are taken as UTC.
+    """
+    now = datetime.now(timezone.utc)
+    if value is None:
+        return now
+    if not isinstance(value, str):
+        raise ValueError('at must be an ISO 8601 timestamp')
+    try:
+        acted = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid timestamp: {value}')
+    if acted.tzinfo is None:
+        acted = acted.replace(tzinfo=timezone.utc)
+    # Future times are client clock skew; very old ones would rewrite settled history
+    return min(max(acted.astimezone(timezone.utc), now - MAX_MUTATION_AGE), now)
+
+def apply_progress(c, question_id, is_correct, time_spent=None, notes=None, at=None):
+    """Record an attempt (or undo when is_correct is None) using an open cursor (caller commits).
+    
+    at is when the learner acted (see parse_client_time), so a queued offline
+    completion is dated by the day it was made, not the day it reached the server.
+    """
+    acted = parse_client_time(at)
+    # A completion without an explicit time closes the question's timer and uses its total
+    if is_correct is not None and time_spent is None:
+        time_spent = finish_timer(c, question_id)
+    today = acted.astimezone(get_user_timezone()).date()
+    today_day = epoch_day(today)
+    
+    # Every attempt and every undo is appended to the log, history is never rewritten
+    c.execute('''
+        INSERT INTO attempts (question_id, attempt_date, is_correct, time_spent, attempted_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (question_id, today.isoformat(), is_correct, time_spent, acted.strftime('%Y-%m-%d %H:%M:%S')))
+    
+    # Handle undo (is_correct is null)
+    if is_correct is None:
+        retracted = rebuild_progress_state(c, question_id)
+        if retracted:
+            record_rollup(c, question_id, retracted[0], retracted[1], retracted[2], sign=-1)
+            # Only an undo that empties a study day can shorten the streak
+            c.execute('''
+                SELECT COALESCE(SUM(correct + wrong), 0) FROM daily_rollups
+                WHERE user_id = 'default' AND day = ?
+            ''', (retracted[0],))
+            if c.fetchone()[0] == 0:
+                rebuild_streak(c)
+        return
+    
+    record_rollup(c, question_id, today.isoformat(), is_correct, time_spent)
+    update_streak(c, today)
+    
+    # Check if exists
+    c.execute('SELECT id, review_count, completed_day FROM progress WHERE question_id = ?', (question_id,))
+    existing = c.fetchone()
+    
+    if existing:
+        # Completed before today means this is a review, so increment review_count
+        is_review = existing[2] is not None and existing[2] < today_day
+        new_review_count = (existing[1] or 0) + (1 if is_review else 0)
+        
+        # If marking as complete, remove deferred status
+        c.execute('''
+            UPDATE progress 
+            SET completed_date = ?, completed_day = ?, is_correct = ?, time_spent = ?,
+                notes = COALESCE(?, notes), review_count = ?, last_review_date = ?, last_review_day = ?,
+                deferred = 0, deferred_date = NULL
+            WHERE question_id = ?
+        ''', (today.isoformat(), today_day, is_correct, time_spent, notes, new_review_count,
+              today.isoformat() if is_review else None, today_day if is_review else None, question_id))
+    else:
+        c.execute('''
+            INSERT INTO progress (question_id, completed_date, completed_day, is_correct, time_spent, notes, deferred)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (question_id, today.isoformat(), today_day, is_correct, time_spent, notes))
+
+def rebuild_progress_state(c, question_id):
+    """Recompute a question's latest progress state from its attempt log.
+    
+    An undo (is_correct NULL) retracts the most recent attempt that is still in
+    effect. Notes and deferred status are left untouched.
+    """
+    c.execute('''
+        SELECT attempt_date, is_correct, time_spent FROM attempts
+        WHERE question_id = ?
+        ORDER BY id
+    ''', (question_id,))
+    
+    effective = []
+    retracted = None
+    for row in c.fetchall():
+        if row[1] is None:
+            retracted = effective.pop() if effective else None
+        else:
+            effective.append(row)
+    
+    # Replay the remaining attempts the same way apply_progress builds the state
+    completed_date = is_correct = time_spent = last_review_date = None
+    review_count = 0
+    for attempt_date, attempt_correct, attempt_time in effective:
+        is_review = completed_date is not None and completed_date < attempt_date
+        if is_review:
+            review_count += 1
+        last_review_date = attempt_date if is_review else None
+        completed_date, is_correct, time_spent = attempt_date, attempt_correct, attempt_time
+    
+    c.execute(f'''
+        UPDATE progress
+        SET completed_date = ?, completed_day = {EPOCH_DAY_SQL.format('?')}, is_correct = ?, time_spent = ?,
+            review_count = ?, last_review_date = ?, last_review_day = {EPOCH_DAY_SQL.format('?')}
+        WHERE question_id = ?
+    ''', (completed_date, completed_date, is_correct, time_spent, review_count,
+          last_review_date, last_review_date, question_id))
+    
+    return retracted
+
+def update_streak(c, study_date):
+    """Extend or reset the study streak for an attempt made on study_date"""
+    c.execute('SELECT streak_days, longest_streak, last_study_date FROM statistics WHERE id = 1')
+    row = c.fetchone()
+    streak, longest, last_date = (row[0] or 0, row[1] or 0, row[2]) if row else (0, 0, None)
+    
+    day = epoch_day(study_date)
+    last_day = epoch_day(date.fromisoformat(last_date)) if last_date else None
+    if last_day == day:
+        return  # Already counted today
+    if last_day is not None and last_day > day:
+        # A late-arriving offline attempt can fill a gap behind the streak's end
+        rebuild_streak(c)
+        return
+    
+    streak = streak + 1 if last_day == day - 1 else 1
+    c.execute('''
+        INSERT INTO statistics (id, streak_days, longest_streak, last_study_date)
+        VALUES (1, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            streak_days = excluded.streak_days,
+            longest_streak = excluded.longest_streak,
+            last_study_date = excluded.last_study_date
+    ''', (streak, max(longest, streak), study_date.isoformat()))
+
+def rebuild_streak(c):
+    """Recompute current and longest streaks from study days in one sorted pass"""
+    c.execute(f'''
+        SELECT {EPOCH_DAY_SQL.format('day')} FROM daily_rollups
+        WHERE user_id = 'default'
+        GROUP BY day
+        HAVING SUM(correct + wrong) > 0
+        ORDER BY day
+    ''')
+    
+    streak = longest = 0
+    previous = None
+    for (current,) in c.fetchall():
+        streak = streak + 1 if previous is not None and current - previous == 1 else 1
+        longest = max(longest, streak)
+        previous = current
+    
+    c.execute('''
+        INSERT INTO statistics (id, streak_days, longest_streak, last_study_date)
+        VALUES (1, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            streak_days = excluded.streak_days,
+            longest_streak = excluded.longest_streak,
+            last_study_date = excluded.last_study_date
+    ''', (streak, longest, from_epoch_day(previous).isoformat() if previous is not None else None))
+
+def effective_attempts(rows):
+    """Replay (question_id, attempt_date, is_correct, time_spent) rows in log order, dropping undone attempts"""
+    stacks = {}
+    for question_id, attempt_date, is_correct, time_spent in rows:
+        stack = stacks.setdefault(question_id, [])
+        if is_correct is None:
+            if stack:
+                stack.pop()
+        else:
+            stack.append((attempt_date, is_correct, time_spent))
+    for question_id, stack in stacks.items():
+        for attempt in stack:
+            yield (question_id,) + attempt
+
+def record_rollup(c, question_id, day, is_correct, time_spent, sign=1, user_id='default'):
+    """Add (sign=1) or retract (sign=-1) one attempt on an ISO day in a user's daily rollups.
+    
+    solved counts correct attempts; wrong ones only add to wrong.
+    """
+    solved = sign if is_correct else 0
+    c.execute('''
+        INSERT INTO daily_rollups (user_id, day, category, solved, correct, wrong, time_spent)
+        SELECT ?, ?, COALESCE((SELECT category FROM questions WHERE id = ?), 'Other'), ?, ?, ?, ?
+        ON CONFLICT (user_id, day, category) DO UPDATE SET
+            solved = solved + excluded.solved,
+            correct = correct + excluded.correct,
+            wrong = wrong + excluded.wrong,
+            time_spent = time_spent + excluded.time_spent
+    ''', (user_id, day, question_id, solved, solved, sign - solved, sign * (time_spent or 0)))
+
+def rebuild_rollups(c, user_id='default'):
+    """Rebuild a user's daily rollups from their attempt log in one pass"""
+    c.execute('DELETE FROM daily_rollups WHERE user_id = ?', (user_id,))
+    c.execute('''
+        SELECT question_id, attempt_date, is_correct, time_spent FROM attempts
+        WHERE user_id = ?
+        ORDER BY id
+    ''', (user_id,))
+    buckets = {}
+    for question_id, day, is_correct, time_spent in effective_attempts(c.fetchall()):
+        buckets.setdefault((question_id, day), []).append((is_correct, time_spent))
+    
+    c.execute('SELECT id, category FROM questions')
+    categories = dict(c.fetchall())
+    
+    totals = {}
+    for (question_id, day), attempts in buckets.items():
+        key = (day, categories.get(question_id, 'Other'))
+        row = totals.setdefault(key, [0, 0, 0, 0])
+        for is_correct, time_spent in attempts:
+            if is_correct:
+                row[0] += 1
+            row[1 if is_correct else 2] += 1
+            row[3] += time_spent or 0
+    
+    c.executemany('''
+        INSERT INTO daily_rollups (user_id, day, category, solved, correct, wrong, time_spent)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(user_id,) + key + tuple(row) for key, row in totals.items()])
+
+def question_id_error(value):
+    """Why value is not a usable question id, or None when it is one"""
+    if value is None:
+        return 'question_id is required'
+    if isinstance(value, bool) or not isinstance(value, int):
+        return 'question_id must be an integer'
+    return None
+
 @app.route('/api/progress', methods=['POST'])
 def update_progress():
     """Update study progress"""
@@ -1220,224 +2647,1692 @@ def update_progress():
         question_id = data.get('question_id')
         is_correct = data.get('is_correct', True)
         time_spent = data.get('time_spent')
-        notes = data.get('notes', '')
+        notes = data.get('notes')
         
-        if question_id is None:
-            return jsonify({'success': False, 'error': 'question_id is required'}), 400
+        error = question_id_error(question_id)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        try:
+            parse_client_time(data.get('at'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Handle undo (is_correct is null)
-        if is_correct is None:
-            # Delete the progress entry
-            conn = get_db_connection()
+        with writer_connection() as conn:
+            c = conn.cursor()
+            apply_progress(c, question_id, is_correct, time_spent, notes, data.get('at'))
+            conn.commit()
+            
+            # Update statistics in a separate transaction
             try:
-                c = conn.cursor()
-                c.execute('DELETE FROM progress WHERE question_id = ?', (question_id,))
+                update_statistics(conn)
                 conn.commit()
-                return jsonify({'success': True})
-            finally:
-                conn.close()
+            except Exception as e:
+                print(f"Warning: Failed to update statistics: {e}")
         
-        conn = get_db_connection()
-        try:
+        return jsonify({'success': True})
+    except sqlite3.OperationalError as e:
+        print(f"Database error: {e}")
+        return jsonify({'success': False, 'error': 'Database error, please try again'}), 500
+    except Exception as e:
+        print(f"Error updating progress: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Mutation types accepted by /api/batch, mapped to their cursor-level handlers
+BATCH_MUTATIONS = {
+    'progress': lambda c, m: apply_progress(c, m['question_id'], m.get('is_correct', True),
+                                            m.get('time_spent'), m.get('notes'), m.get('at')),
+    'defer': lambda c, m: apply_defer(c, m['question_id']),
+    'undefer': lambda c, m: apply_undefer(c, m['question_id']),
+    'note': lambda c, m: apply_note(c, m['question_id'], m.get('note', '')),
+}
+
+@app.route('/api/batch', methods=['POST'])
+def apply_batch():
+    """Apply an ordered list of mutations atomically in one transaction"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        
+        mutations = data.get('mutations')
+        if not isinstance(mutations, list) or not mutations:
+            return jsonify({'success': False, 'error': 'mutations must be a non-empty list'}), 400
+        
+        # Validate everything up front so a bad item never leaves a partial transaction
+        for index, mutation in enumerate(mutations):
+            if not isinstance(mutation, dict) or mutation.get('type') not in BATCH_MUTATIONS:
+                return jsonify({'success': False, 'index': index,
+                                'error': f"Unknown mutation type at index {index}"}), 400
+            error = question_id_error(mutation.get('question_id'))
+            if error:
+                return jsonify({'success': False, 'index': index,
+                                'error': f"{error} at index {index}"}), 400
+            try:
+                parse_client_time(mutation.get('at'))
+            except ValueError as e:
+                return jsonify({'success': False, 'index': index, 'error': f"{e} at index {index}"}), 400
+        
+        results = []
+        with writer_connection() as conn:
             c = conn.cursor()
+            for index, mutation in enumerate(mutations):
+                try:
+                    BATCH_MUTATIONS[mutation['type']](c, mutation)
+                except Exception as e:
+                    # Earlier items are rolled back too, so report no per-item results
+                    conn.rollback()
+                    print(f"Error applying batch item {index}: {e}")
+                    return jsonify({'success': False, 'index': index, 'error': str(e)}), 500
+                results.append({
+                    'index': index,
+                    'type': mutation['type'],
+                    'question_id': mutation['question_id'],
+                    'success': True
+                })
             
-            # Check if exists
-            c.execute('SELECT id, review_count FROM progress WHERE question_id = ?', (question_id,))
-            existing = c.fetchone()
-            
-            if existing:
-                # If it's a review (already completed before), increment review_count
-                current_review_count = existing[1] or 0
-                # Check if this question was completed before today (indicating it's a review)
-                c.execute('SELECT completed_date, deferred FROM progress WHERE question_id = ?', (question_id,))
-                prev_data = c.fetchone()
-                
-                is_review = False
-                if prev_data and prev_data[0]:
-                    # Convert string date to date object if needed
-                    prev_date = prev_data[0]
-                    if isinstance(prev_date, str):
-                        prev_date = datetime.strptime(prev_date, '%Y-%m-%d').date()
-                    elif isinstance(prev_date, datetime):
-                        prev_date = prev_date.date()
-                    # Check if completed before today
-                    is_review = prev_date < datetime.now().date()
-                
-                new_review_count = current_review_count + 1 if is_review else current_review_count
-                
-                # If marking as complete, remove deferred status
-                c.execute('''
-                    UPDATE progress 
-                    SET completed_date = ?, is_correct = ?, time_spent = ?, notes = ?, 
-                        review_count = ?, last_review_date = ?, deferred = 0, deferred_date = NULL
-                    WHERE question_id = ?
-                ''', (datetime.now().date(), is_correct, time_spent, notes, 
-                      new_review_count, datetime.now().date() if is_review else None, question_id))
-            else:
-                c.execute('''
-                    INSERT INTO progress (question_id, completed_date, is_correct, time_spent, notes, deferred)
-                    VALUES (?, ?, ?, ?, ?, 0)
-                ''', (question_id, datetime.now().date(), is_correct, time_spent, notes))
-            
+            # Statistics are refreshed once for the whole batch, inside the same transaction
+            if any(m['type'] == 'progress' for m in mutations):
+                update_statistics(conn)
             conn.commit()
-        finally:
-            conn.close()
-        
-        # Update statistics in a separate connection
-        try:
-            update_statistics()
-        except Exception as e:
-            print(f"Warning: Failed to update statistics: {e}")
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'results': results})
     except sqlite3.OperationalError as e:
         print(f"Database error: {e}")
         return jsonify({'success': False, 'error': 'Database error, please try again'}), 500
     except Exception as e:
-        print(f"Error updating progress: {e}")
+        print(f"Error applying batch: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def timer_state(c, question_id, now=None):
+    """Fold the open session's events into (state, elapsed seconds, running since)"""
+    c.execute('''
+        SELECT event, at FROM timing_events
+        WHERE user_id = 'default' AND question_id = ?
+          AND id > COALESCE((
+              SELECT MAX(id) FROM timing_events
+              WHERE user_id = 'default' AND question_id = ? AND event = 'finish'
+          ), 0)
+        ORDER BY id
+    ''', (question_id, question_id))
+    rows = c.fetchall()
+    if not rows:
+        return 'idle', 0, None
+    
+    elapsed = 0.0
+    running_since = None
+    for event, at in rows:
+        if event == 'start' and running_since is None:
+            running_since = at
+        elif event == 'pause' and running_since is not None:
+            elapsed += at - running_since
+            running_since = None
+    
+    if running_since is not None:
+        elapsed += (now or time.time()) - running_since
+        return 'running', elapsed, running_since
+    return 'paused', elapsed, None
+
+def finish_timer(c, question_id):
+    """Close the question's open session and add it to question_time; None if no session"""
+    now = time.time()
+    state, elapsed, _ = timer_state(c, question_id, now)
+    if state == 'idle':
+        return None
+    
+    seconds = int(round(elapsed))
+    c.execute('''
+        INSERT INTO timing_events (question_id, event, at) VALUES (?, 'finish', ?)
+    ''', (question_id, now))
+    c.execute('''
+        INSERT INTO question_time (user_id, question_id, total_seconds, sessions, last_finished_at)
+        VALUES ('default', ?, ?, 1, ?)
+        ON CONFLICT (user_id, question_id) DO UPDATE SET
+            total_seconds = total_seconds + excluded.total_seconds,
+            sessions = sessions + 1,
+            last_finished_at = excluded.last_finished_at
+    ''', (question_id, seconds, now))
+    return seconds
+
+def timer_response(c, question_id):
+    state, elapsed, running_since = timer_state(c, question_id)
+    return {
+        'question_id': question_id,
+        'state': state,
+        'elapsed': int(elapsed),
+        'running_since': running_since
+    }
+
+def timing_question_id():
+    """Validated question_id from a timing request body, or None"""
+    question_id = (request.get_json(silent=True) or {}).get('question_id')
+    if not isinstance(question_id, int) or question_id not in get_catalogue():
+        return None
+    return question_id
+
+def record_timing_event(event, allowed_states):
+    """Append a start/pause event when the timer is in one of allowed_states"""
+    question_id = timing_question_id()
+    if question_id is None:
+        return jsonify({'success': False, 'error': 'Valid question_id is required'}), 400
+    
+    with writer_connection() as conn:
+        c = conn.cursor()
+        state, _, _ = timer_state(c, question_id)
+        if state in allowed_states:
+            c.execute('''
+                INSERT INTO timing_events (question_id, event, at) VALUES (?, ?, ?)
+            ''', (question_id, event, time.time()))
+            conn.commit()
+        return jsonify({'success': True, 'timer': timer_response(c, question_id)})
+
+@app.route('/api/timing/start', methods=['POST'])
+def start_timer():
+    """Start or resume the timer for a question"""
+    return record_timing_event('start', ('idle', 'paused'))
+
+@app.route('/api/timing/pause', methods=['POST'])
+def pause_timer():
+    """Pause a running timer"""
+    return record_timing_event('pause', ('running',))
+
+@app.route('/api/timing/finish', methods=['POST'])
+def finish_timer_api():
+    """Finish a timed session, optionally completing the question with its time"""
+    data = request.get_json(silent=True) or {}
+    question_id = timing_question_id()
+    if question_id is None:
+        return jsonify({'success': False, 'error': 'Valid question_id is required'}), 400
+    
+    try:
+        with writer_connection() as conn:
+            c = conn.cursor()
+            if data.get('is_correct') is not None:
+                apply_progress(c, question_id, bool(data['is_correct']))
+                c.execute('SELECT time_spent FROM progress WHERE question_id = ?', (question_id,))
+                seconds = c.fetchone()[0]
+                update_statistics(conn)
+            else:
+                seconds = finish_timer(c, question_id)
+                if seconds is None:
+                    return jsonify({'success': False, 'error': 'No timer running'}), 400
+            conn.commit()
+        return jsonify({'success': True, 'time_spent': seconds})
+    except Exception as e:
+        print(f"Error finishing timer: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/timing/active', methods=['GET'])
+def get_active_timers():
+    """Open (running or paused) timers, so the client can tick them locally"""
+    conn = acquire_read_connection()
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT question_id FROM timing_events e
+            WHERE user_id = 'default'
+              AND id = (SELECT MAX(id) FROM timing_events
+                        WHERE user_id = 'default' AND question_id = e.question_id)
+              AND event != 'finish'
+        ''')
+        return jsonify({'timers': [timer_response(c, row[0]) for row in c.fetchall()]})
+    finally:
+        release_read_connection(conn)
+
+@app.route('/api/timing/summary', methods=['GET'])
+def get_timing_summary():
+    """Time totals and pace per question and per category"""
+    conn = acquire_read_connection()
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT qt.question_id, q.title, q.category, q.difficulty, qt.total_seconds, qt.sessions
+            FROM question_time qt
+            JOIN questions q ON q.id = qt.question_id
+            WHERE qt.user_id = 'default'
+            ORDER BY qt.total_seconds DESC
+        ''')
+        questions = [{
+            'question_id': row[0],
+            'title': row[1],
+            'category': row[2],
+            'difficulty': row[3],
+            'total_seconds': row[4],
+            'sessions': row[5],
+            'avg_seconds': row[4] // row[5] if row[5] else 0
+        } for row in c.fetchall()]
+        
+        c.execute('''
+            SELECT q.category, SUM(qt.total_seconds), SUM(qt.sessions), COUNT(*)
+            FROM question_time qt
+            JOIN questions q ON q.id = qt.question_id
+            WHERE qt.user_id = 'default'
+            GROUP BY q.category
+            ORDER BY SUM(qt.total_seconds) DESC
+        ''')
+        categories = [{
+            'category': row[0],
+            'total_seconds': row[1],
+            'sessions': row[2],
+            'questions': row[3],
+            'avg_seconds_per_question': row[1] // row[3] if row[3] else 0
+        } for row in c.fetchall()]
+        
+        return jsonify({'questions': questions, 'categories': categories})
+    finally:
+        release_read_connection(conn)
+
+# Upper bound on changes returned by a single /api/sync call
+SYNC_PAGE_SIZE = 500
+
+@app.route('/api/sync', methods=['GET'])
+def sync_changes():
+    """Get progress and note changes after a change-log version"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(1, request.args.get('limit', SYNC_PAGE_SIZE, type=int)), SYNC_PAGE_SIZE)
+    user_id = 'default'
+    
+    conn = acquire_read_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        c = conn.cursor()
+        
+        # Collapse repeated writes to the same question into its latest version
+        c.execute('''
+            SELECT question_id, MAX(version) as version
+            FROM change_log
+            WHERE user_id = ? AND version > ?
+            GROUP BY question_id
+            ORDER BY version ASC
+            LIMIT ?
+        ''', (user_id, since, limit + 1))
+        changed = [dict(row) for row in c.fetchall()]
+        has_more = len(changed) > limit
+        changed = changed[:limit]
+        
+        states = {}
+        if changed:
+            question_ids = [row['question_id'] for row in changed]
+            placeholders = ','.join('?' * len(question_ids))
+            c.execute(f'''
+                SELECT question_id, completed_date, is_correct, time_spent, notes,
+                       review_count, last_review_date, deferred, deferred_date
+                FROM progress
+                WHERE user_id = ? AND question_id IN ({placeholders})
+            ''', [user_id] + question_ids)
+            states = {row['question_id']: dict(row) for row in c.fetchall()}
+        
+        # Undo rewrites the row from the attempt log; a missing row was deleted by
+        # manage.py (reset-progress or check --fix)
+        changes = [{
+            'question_id': row['question_id'],
+            'version': row['version'],
+            'progress': states.get(row['question_id'])
+        } for row in changed]
+        
+        if has_more:
+            version = changed[-1]['version']
+        else:
+            c.execute('SELECT MAX(version) FROM change_log WHERE user_id = ?', (user_id,))
+            version = max(c.fetchone()[0] or 0, since)
+    finally:
+        release_read_connection(conn)
+    
+    return jsonify({
+        'version': version,
+        'changes': changes,
+        'has_more': has_more
+    })
+
 @app.route('/api/statistics', methods=['GET'])
+@coalesce_reads
 def get_statistics():
     """Get study statistics"""
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    store = get_storage()
+    try:
+        # Overall statistics
+        stats = store.completion_totals()
+        
+        # Statistics by category and difficulty
+        stats['by_category'] = store.completed_by('category')
+        stats['by_difficulty'] = store.completed_by('difficulty')
+        
+        # Streaks are maintained on write; a streak is broken once a full day passes without study
+        stored = store.get_statistics()
+    finally:
+        store.close()
     
-    # Overall statistics
-    c.execute('''
-        SELECT 
-            COUNT(*) as total_completed,
-            SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as total_correct,
-            SUM(CASE WHEN is_correct = 0 THEN 1 ELSE 0 END) as total_wrong
-        FROM progress
-    ''')
-    stats = dict(c.fetchone())
+    last_study_date = stored.get('last_study_date')
+    if last_study_date and epoch_day(date.fromisoformat(last_study_date)) >= epoch_day(user_today()) - 1:
+        stats['streak_days'] = stored.get('streak_days') or 0
+    else:
+        stats['streak_days'] = 0
+    stats['longest_streak'] = stored.get('longest_streak') or 0
+    stats['last_study_date'] = last_study_date
     
-    # Statistics by category
-    c.execute('''
-        SELECT category, COUNT(*) as count
-        FROM questions q
-        JOIN progress p ON q.id = p.question_id
-        GROUP BY category
-        ORDER BY count DESC
-    ''')
-    stats['by_category'] = {row[0]: row[1] for row in c.fetchall()}
+    # Total questions
+    stats['total_questions'] = len(get_catalogue())
     
-    # Statistics by difficulty
-    c.execute('''
-        SELECT difficulty, COUNT(*) as count
-        FROM questions q
-        JOIN progress p ON q.id = p.question_id
-        GROUP BY difficulty
-    ''')
-    stats['by_difficulty'] = {row[0]: row[1] for row in c.fetchall()}
+    return jsonify(stats)
+
+# SQL expressions that map a rollup day onto the start of its bucket
+ANALYTICS_BUCKETS = {
+    'day': 'day',
+    'week': "date(day, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', day)",
+}
+
+@app.route('/api/analytics', methods=['GET'])
+@coalesce_reads
+def get_analytics():
+    """Get time-bucketed study aggregates over a date range"""
+    bucket = request.args.get('bucket', 'day')
+    group_by = request.args.get('group_by', 'none')
+    if bucket not in ANALYTICS_BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(ANALYTICS_BUCKETS)}"}), 400
+    if group_by not in ('none', 'category'):
+        return jsonify({'error': 'group_by must be none or category'}), 400
     
-    # Streak days
-    c.execute('''
-        SELECT COUNT(DISTINCT completed_date) as streak
-        FROM progress
-        WHERE completed_date >= date('now', '-30 days')
-    ''')
-    stats['streak_days'] = c.fetchone()[0] or 0
+    try:
+        today = user_today()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if 'end' in request.args else today
+        start = (datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+                 if 'start' in request.args else end - timedelta(days=29))
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
     
-    # Total questions
-    c.execute('SELECT COUNT(*) FROM questions')
-    stats['total_questions'] = c.fetchone()[0]
+    bucket_expr = ANALYTICS_BUCKETS[bucket]
+    group_columns = f'{bucket_expr}, category' if group_by == 'category' else bucket_expr
+    category_column = 'category' if group_by == 'category' else 'NULL'
     
+    conn = acquire_read_connection()
+    conn.row_factory = sqlite3.Row
     try:
-        return jsonify(stats)
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT {bucket_expr} as bucket, {category_column} as category,
+                   SUM(solved) as solved, SUM(correct) as correct,
+                   SUM(wrong) as wrong, SUM(time_spent) as time_spent
+            FROM daily_rollups
+            WHERE user_id = ? AND day BETWEEN ? AND ?
+            GROUP BY {group_columns}
+            HAVING SUM(correct + wrong) > 0
+            ORDER BY bucket, category
+        ''', ('default', start.isoformat(), end.isoformat()))
+        
+        series = []
+        for row in c.fetchall():
+            point = dict(row)
+            if group_by != 'category':
+                del point['category']
+            answered = point['correct'] + point['wrong']
+            point['accuracy'] = round(point['correct'] / answered, 4) if answered else None
+            series.append(point)
     finally:
-        conn.close()
+        release_read_connection(conn)
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket': bucket,
+        'group_by': group_by,
+        'series': series
+    })
+
+# Upper bound on results returned by a single /api/search call
+SEARCH_PAGE_SIZE = 50
+
+def build_search_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    terms = [term.replace('"', '') for term in text.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+@app.route('/api/search', methods=['GET'])
+def search_questions():
+    """Search question titles, categories and personal notes"""
+    text = request.args.get('q', '').strip()
+    limit = min(max(1, request.args.get('limit', 20, type=int)), SEARCH_PAGE_SIZE)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    match = build_search_query(text)
+    if not match:
+        return jsonify({'query': text, 'results': [], 'has_more': False, 'next_offset': None})
+    
+    conn = acquire_read_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        c = conn.cursor()
+        # Title hits outrank category hits, which outrank note hits
+        c.execute('''
+            SELECT q.id, q.title, q.difficulty, q.category, q.leetcode_id, q.day_number,
+                   snippet(search_index, 2, '<mark>', '</mark>', '…', 12) as snippet,
+                   bm25(search_index, 10.0, 4.0, 1.0) as rank
+            FROM search_index
+            JOIN questions q ON q.id = search_index.rowid
+            WHERE search_index MATCH ?
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        ''', (match, limit + 1, offset))
+        results = [dict(row) for row in c.fetchall()]
+    except sqlite3.OperationalError as e:
+        print(f"Error searching questions: {e}")
+        return jsonify({'error': 'Search is unavailable'}), 503
+    finally:
+        release_read_connection(conn)
+    
+    has_more = len(results) > limit
+    return jsonify({
+        'query': text,
+        'results': results[:limit],
+        'has_more': has_more,
+        'next_offset': offset + limit if has_more else None
+    })
+
+# Days after a completion when the forgetting curve brings a question back for review
+REVIEW_INTERVALS = [1, 3, 7, 14]
+
+# Review list sources, tried in order until one has questions:
+# questions due on an Ebbinghaus interval, then recently wrong, then recently completed
+REVIEW_MODES = {
+    'due': 'p.completed_day IN ({intervals})',
+    'wrong': 'p.is_correct = 0',
+    'recent': '1 = 1',
+}
 
 @app.route('/api/review', methods=['GET'])
+@coalesce_reads
 def get_review_list():
-    """Get review list based on Ebbinghaus forgetting curve"""
+    """Get review list based on Ebbinghaus forgetting curve, one keyset page at a time"""
+    limit = get_page_size()
+    try:
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if cursor and (cursor.get('mode') not in REVIEW_MODES or 'completed_day' not in cursor):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
     try:
-        conn = get_db_connection()
+        conn = acquire_read_connection()
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
         
-        review_intervals = [1, 3, 7, 14]
-        today = datetime.now().date()
+        today = user_today()
+        due_days = [epoch_day(today) - interval for interval in REVIEW_INTERVALS]
+        
+        def mode_filter(mode):
+            placeholders = ','.join('?' * len(due_days))
+            params = due_days if mode == 'due' else []
+            return REVIEW_MODES[mode].format(intervals=placeholders), params
+        
+        # The first page picks the first source with any questions; later pages stay on it
+        mode = cursor['mode'] if cursor else None
+        if mode is None:
+            for candidate in REVIEW_MODES:
+                condition, params = mode_filter(candidate)
+                c.execute(f'''
+                    SELECT 1 FROM progress p
+                    WHERE p.completed_day IS NOT NULL AND {condition}
+                    LIMIT 1
+                ''', params)
+                if c.fetchone():
+                    mode = candidate
+                    break
+        if mode is None:
+            return jsonify({'items': [], 'next_cursor': None})
+        
+        condition, params = mode_filter(mode)
+        # Most recent first; within a day previously wrong questions come first
+        keyset = ''
+        if cursor:
+            keyset = '''AND (p.completed_day < ? OR (p.completed_day = ? AND
+                        (p.is_correct > ? OR (p.is_correct = ? AND p.id > ?))))'''
+            params = params + [cursor['completed_day'], cursor['completed_day'],
+                               cursor['is_correct'], cursor['is_correct'], cursor['id']]
+        
+        c.execute(f'''
+            SELECT q.*, p.id as progress_id, p.completed_date, p.completed_day, p.is_correct,
+                   p.review_count
+            FROM progress p
+            JOIN questions q ON q.id = p.question_id
+            WHERE p.completed_day IS NOT NULL AND {condition} {keyset}
+            ORDER BY p.completed_day DESC, p.is_correct ASC, p.id ASC
+            LIMIT ?
+        ''', params + [limit + 1])
+        rows = c.fetchall()
         
         review_questions = []
-        for interval in review_intervals:
-            target_date = today - timedelta(days=interval)
-            c.execute('''
-                SELECT q.*, p.completed_date, p.is_correct, p.review_count
-                FROM questions q
-                JOIN progress p ON q.id = p.question_id
-                WHERE p.completed_date = ?
-                ORDER BY p.is_correct ASC, p.review_count ASC
-            ''', (target_date,))
-            
-            for row in c.fetchall():
-                review_questions.append(dict(row))
+        for row in rows[:limit]:
+            q_dict = dict(row)
+            del q_dict['progress_id'], q_dict['completed_day']
+            review_questions.append(q_dict)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor({
+                'mode': mode,
+                'completed_day': last['completed_day'],
+                'is_correct': last['is_correct'],
+                'id': last['progress_id']
+            })
+        
+        return jsonify({'items': review_questions, 'next_cursor': next_cursor})
+    except Exception as e:
+        print(f"Error getting review list: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'conn' in locals():
+            release_read_connection(conn)
 
-        # If no questions match the exact Ebbinghaus intervals,
-        # fall back to recently wrong questions, then recently completed ones.
-        if not review_questions:
-            # First, recently wrong questions (most important to review)
-            c.execute('''
-                SELECT q.*, p.completed_date, p.is_correct, p.review_count
-                FROM questions q
-                JOIN progress p ON q.id = p.question_id
-                WHERE p.is_correct = 0
-                ORDER BY p.completed_date DESC, p.review_count ASC
-                LIMIT 10
-            ''')
-            review_questions = [dict(row) for row in c.fetchall()]
+# Practice sets are evaluated as Python-int bitsets where bit n is question id n,
+# so a filter is a handful of ANDs/ORs over precomputed masks
+PRACTICE_STATUSES = ('new', 'completed', 'correct', 'wrong', 'deferred')
+PRACTICE_LIST_FILTERS = ('categories', 'difficulties', 'tags', 'days', 'status', 'exclude_status')
+
+def ids_to_bits(ids):
+    bits = 0
+    for qid in ids:
+        bits |= 1 << qid
+    return bits
 
-        if not review_questions:
-            # If still empty, use most recently completed questions
+def bits_to_ids(bits):
+    """Set bit positions in ascending order"""
+    ids = []
+    while bits:
+        low = bits & -bits
+        ids.append(low.bit_length() - 1)
+        bits ^= low
+    return ids
+
+class CatalogueBitsets:
+    """Bitsets per category, difficulty, tag and day for one catalogue"""
+    
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.all = ids_to_bits(catalogue.ids())
+        self.by_field = {
+            'categories': {k: ids_to_bits(catalogue.ids_for_category(k)) for k in catalogue.categories()},
+            'difficulties': {k: ids_to_bits(catalogue.ids_for_difficulty(k)) for k in catalogue.difficulties()},
+            'tags': {k: ids_to_bits(catalogue.ids_for_tag(k)) for k in catalogue.tags()},
+            'days': {k: ids_to_bits(catalogue.ids_for_day(k)) for k in catalogue.days()},
+        }
+
+class StatusBitsets:
+    """Bitsets per progress status, plus prefix masks over last-attempt dates"""
+    
+    def __init__(self, rows):
+        self.by_status = {status: 0 for status in PRACTICE_STATUSES}
+        dated = []
+        for question_id, completed_date, is_correct, deferred in rows:
+            bit = 1 << question_id
+            if completed_date:
+                self.by_status['completed'] |= bit
+                self.by_status['correct' if is_correct else 'wrong'] |= bit
+                dated.append((completed_date, question_id))
+            if deferred:
+                self.by_status['deferred'] |= bit
+        
+        # prefix[i] holds the i questions attempted longest ago
+        dated.sort()
+        self.dates = [d for d, _ in dated]
+        self.prefix = [0]
+        for _, question_id in dated:
+            self.prefix.append(self.prefix[-1] | (1 << question_id))
+    
+    def new(self, all_bits):
+        return all_bits & ~self.by_status['completed']
+    
+    def attempted_before(self, cutoff):
+        """Questions whose last attempt was strictly before cutoff (ISO date)"""
+        return self.prefix[bisect.bisect_left(self.dates, cutoff)]
+
+_bitset_cache = {'catalogue': None, 'status_version': None, 'status': None}
+_bitset_lock = threading.Lock()
+
+def get_catalogue_bitsets() -> CatalogueBitsets:
+    """Bitsets for the current catalogue, rebuilt when the catalogue is replaced"""
+    catalogue = get_catalogue()
+    bitsets = _bitset_cache['catalogue']
+    if bitsets is None or bitsets.catalogue is not catalogue:
+        bitsets = CatalogueBitsets(catalogue)
+        _bitset_cache['catalogue'] = bitsets
+    return bitsets
+
+def get_status_bitsets(c) -> StatusBitsets:
+    """Status bitsets for the default user, rebuilt only when the change log has moved"""
+    c.execute('SELECT COALESCE(MAX(version), 0) FROM change_log')
+    version = c.fetchone()[0]
+    with _bitset_lock:
+        if _bitset_cache['status_version'] != version:
             c.execute('''
-                SELECT q.*, p.completed_date, p.is_correct, p.review_count
-                FROM questions q
-                JOIN progress p ON q.id = p.question_id
-                ORDER BY p.completed_date DESC, p.review_count ASC
-                LIMIT 10
+                SELECT question_id, completed_date, is_correct, deferred
+                FROM progress
+                WHERE user_id = 'default'
             ''')
-            review_questions = [dict(row) for row in c.fetchall()]
+            _bitset_cache['status'] = StatusBitsets(c.fetchall())
+            _bitset_cache['status_version'] = version
+        return _bitset_cache['status']
 
-        # Return at most 10 questions
-        return jsonify(review_questions[:10])
-    except Exception as e:
-        print(f"Error getting review list: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+def parse_practice_filters(data) -> Dict:
+    """Validate and normalize a practice-set filter definition, raising ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('filters must be an object')
+    unknown = set(data) - set(PRACTICE_LIST_FILTERS) - {'not_reviewed_days'}
+    if unknown:
+        raise ValueError(f'Unknown filters: {", ".join(sorted(unknown))}')
+    
+    filters = {}
+    for field in PRACTICE_LIST_FILTERS:
+        values = data.get(field)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            raise ValueError(f'{field} must be a list')
+        if field == 'days':
+            if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                raise ValueError('days must be integers')
+        elif not all(isinstance(v, str) for v in values):
+            raise ValueError(f'{field} must be strings')
+        if field in ('status', 'exclude_status'):
+            invalid = set(values) - set(PRACTICE_STATUSES)
+            if invalid:
+                raise ValueError(f'Invalid status: {", ".join(sorted(map(str, invalid)))}')
+        if values:
+            filters[field] = sorted(set(values))
+    
+    days = data.get('not_reviewed_days')
+    if days is not None:
+        if not isinstance(days, int) or isinstance(days, bool) or days < 0:
+            raise ValueError('not_reviewed_days must be a non-negative integer')
+        filters['not_reviewed_days'] = days
+    return filters
+
+def evaluate_practice_set(c, filters) -> List[int]:
+    """Question ids matching filters: OR within a field, AND across fields"""
+    catalogue_bits = get_catalogue_bitsets()
+    status_bits = get_status_bitsets(c)
+    
+    def status_mask(status):
+        if status == 'new':
+            return status_bits.new(catalogue_bits.all)
+        return status_bits.by_status[status]
+    
+    bits = catalogue_bits.all
+    for field, masks in catalogue_bits.by_field.items():
+        if field in filters:
+            selected = 0
+            for value in filters[field]:
+                selected |= masks.get(value, 0)
+            bits &= selected
+    if 'status' in filters:
+        selected = 0
+        for status in filters['status']:
+            selected |= status_mask(status)
+        bits &= selected
+    for status in filters.get('exclude_status', ()):
+        bits &= ~status_mask(status)
+    if 'not_reviewed_days' in filters:
+        cutoff = (user_today() - timedelta(days=filters['not_reviewed_days'] - 1)).isoformat()
+        bits &= status_bits.attempted_before(cutoff)
+    return bits_to_ids(bits)
+
+def practice_set_response(c, filters):
+    """Evaluate filters into the same shape /api/questions returns"""
+    catalogue = get_catalogue_bitsets().catalogue
+    ids = evaluate_practice_set(c, filters)
+    return {
+        'filters': filters,
+        'total': len(ids),
+        'questions': [catalogue.get(qid).to_dict() for qid in ids]
+    }
+
+def practice_set_to_dict(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'filters': json.loads(row[2]),
+        'share_token': row[3],
+        'created_at': row[4]
+    }
+
+@app.route('/api/practice-sets/evaluate', methods=['POST'])
+def evaluate_practice_set_api():
+    """Evaluate an unsaved practice-set filter"""
+    try:
+        filters = parse_practice_filters((request.get_json(silent=True) or {}).get('filters', {}))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    conn = acquire_read_connection()
+    try:
+        return jsonify(practice_set_response(conn.cursor(), filters))
     finally:
-        if 'conn' in locals():
-            conn.close()
+        release_read_connection(conn)
 
-def update_statistics():
-    """Update statistics"""
-    conn = get_db_connection()
+@app.route('/api/practice-sets', methods=['GET'])
+def list_practice_sets():
+    """List saved practice sets"""
+    conn = acquire_read_connection()
     try:
         c = conn.cursor()
+        c.execute('''
+            SELECT id, name, filters, share_token, created_at
+            FROM practice_sets
+            WHERE user_id = 'default'
+            ORDER BY id DESC
+        ''')
+        return jsonify({'sets': [practice_set_to_dict(row) for row in c.fetchall()]})
+    finally:
+        release_read_connection(conn)
+
+@app.route('/api/practice-sets', methods=['POST'])
+def create_practice_set():
+    """Save a practice set; anyone with its share token can load the same filters"""
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return jsonify({'success': False, 'error': 'Name is required'}), 400
+    try:
+        filters = parse_practice_filters(data.get('filters', {}))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        with writer_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                INSERT INTO practice_sets (name, filters, share_token)
+                VALUES (?, ?, ?)
+            ''', (name, json.dumps(filters), secrets.token_urlsafe(9)))
+            c.execute('''
+                SELECT id, name, filters, share_token, created_at
+                FROM practice_sets WHERE id = ?
+            ''', (c.lastrowid,))
+            practice_set = practice_set_to_dict(c.fetchone())
+            conn.commit()
+        return jsonify({'success': True, 'set': practice_set})
+    except Exception as e:
+        print(f"Error saving practice set: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/practice-sets/shared/<token>', methods=['GET'])
+def get_shared_practice_set(token):
+    """Load a practice set by share token, evaluated against the viewer's progress"""
+    conn = acquire_read_connection()
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT id, name, filters, share_token, created_at
+            FROM practice_sets WHERE share_token = ?
+        ''', (token,))
+        row = c.fetchone()
+        if not row:
+            return jsonify({'error': 'Practice set not found'}), 404
         
-        c.execute('SELECT COUNT(*) FROM progress')
-        total = c.fetchone()[0]
+        practice_set = practice_set_to_dict(row)
+        result = practice_set_response(c, practice_set['filters'])
+        result['set'] = practice_set
+        return jsonify(result)
+    finally:
+        release_read_connection(conn)
+
+@app.route('/api/practice-sets/<int:set_id>', methods=['DELETE'])
+def delete_practice_set(set_id):
+    """Delete a saved practice set"""
+    with writer_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM practice_sets WHERE id = ? AND user_id = 'default'", (set_id,))
+        conn.commit()
+    if c.rowcount == 0:
+        return jsonify({'success': False, 'error': 'Practice set not found'}), 404
+    return jsonify({'success': True})
+
+LEADERBOARD_METRICS = ('solved', 'accuracy', 'streak')
+DEFAULT_COHORT = 'all'
+MAX_COHORT_LENGTH = 64
+
+def record_user_score(c, user_id='default'):
+    """Copy a user's statistics totals into user_scores under a new version (caller commits)"""
+    c.execute('''
+        INSERT INTO user_scores (user_id, solved, correct, streak, version, updated_at)
+        SELECT s.user_id, COALESCE(s.total_completed, 0), COALESCE(s.total_correct, 0),
+               COALESCE(s.streak_days, 0),
+               (SELECT COALESCE(MAX(version), 0) + 1 FROM user_scores),
+               CURRENT_TIMESTAMP
+        FROM statistics s
+        WHERE s.user_id = ?
+        ORDER BY s.id
+        LIMIT 1
+        ON CONFLICT (user_id) DO UPDATE SET
+            solved = excluded.solved,
+            correct = excluded.correct,
+            streak = excluded.streak,
+            version = excluded.version,
+            removed = 0,
+            updated_at = excluded.updated_at
+    ''', (user_id,))
+
+def remove_user_score(c, user_id):
+    """Take a user off every leaderboard; a new version tells workers to drop them (caller commits)"""
+    c.execute('''
+        UPDATE user_scores
+        SET solved = 0, correct = 0, streak = 0, removed = 1,
+            version = (SELECT COALESCE(MAX(version), 0) + 1 FROM user_scores),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = ? AND removed = 0
+    ''', (user_id,))
+
+def touch_user_score(c, user_id):
+    """Give a user's score row a new version so workers re-read their cohorts"""
+    c.execute('''
+        INSERT INTO user_scores (user_id, version)
+        VALUES (?, (SELECT COALESCE(MAX(version), 0) + 1 FROM user_scores))
+        ON CONFLICT (user_id) DO UPDATE SET version = excluded.version
+    ''', (user_id,))
+
+def score_values(solved, correct, streak):
+    """Metric values for a score row; accuracy is kept in basis points so it ranks as an int"""
+    return {
+        'solved': solved,
+        'accuracy': correct * 10000 // solved if solved else 0,
+        'streak': streak,
+    }
+
+class RankIndex:
+    """Scores kept sorted best-first; rank and top-N are bisects and slices.
+    
+    update and remove shift the sorted list, O(n) memmoves that stay well under a
+    millisecond for a million users; lookups are O(log n).
+    """
+    
+    def __init__(self):
+        self._keys = []     # (-score, user_id), ascending
+        self._scores = {}   # user_id -> score
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def update(self, user_id, score):
+        self.remove(user_id)
+        bisect.insort(self._keys, (-score, user_id))
+        self._scores[user_id] = score
+    
+    def remove(self, user_id):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            key = (-score, user_id)
+            del self._keys[bisect.bisect_left(self._keys, key)]
+    
+    def rank(self, user_id):
+        """1-based competition rank (ties share a rank), or None if unranked"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score,)) + 1
+    
+    def score(self, user_id):
+        return self._scores.get(user_id)
+    
+    def top(self, limit):
+        """Best entries as (rank, user_id, score)"""
+        entries = []
+        for i, (neg_score, user_id) in enumerate(self._keys[:limit]):
+            rank = entries[-1][0] if entries and entries[-1][2] == -neg_score else i + 1
+            entries.append((rank, user_id, -neg_score))
+        return entries
+
+class Leaderboards:
+    """Per-cohort, per-metric rank indexes, caught up from user_scores by version"""
+    
+    def __init__(self):
+        self.version = 0
+        self.indexes = {}       # (cohort, metric) -> RankIndex
+        self.memberships = {}   # user_id -> set of cohorts
+        self.lock = threading.Lock()
+    
+    def refresh(self, c):
+        """Apply score rows written since the last refresh, by this or any other worker"""
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM user_scores')
+        latest = c.fetchone()[0]
+        if latest == self.version:
+            return
+        with self.lock:
+            if latest == self.version:
+                return
+            c.execute('''
+                SELECT user_id, solved, correct, streak, removed
+                FROM user_scores
+                WHERE version > ?
+                ORDER BY version
+            ''', (self.version,))
+            for user_id, solved, correct, streak, removed in c.fetchall():
+                if removed:
+                    self.remove(user_id)
+                    continue
+                c.execute('SELECT cohort FROM cohort_members WHERE user_id = ?', (user_id,))
+                cohorts = {DEFAULT_COHORT} | {row[0] for row in c.fetchall()}
+                for cohort in self.memberships.get(user_id, set()) - cohorts:
+                    for metric in LEADERBOARD_METRICS:
+                        self.indexes[(cohort, metric)].remove(user_id)
+                
+                values = score_values(solved, correct, streak)
+                for cohort in cohorts:
+                    for metric in LEADERBOARD_METRICS:
+                        self.indexes.setdefault((cohort, metric), RankIndex()).update(user_id, values[metric])
+                self.memberships[user_id] = cohorts
+            self.version = latest
+    
+    def remove(self, user_id):
+        """Drop a user from every index they are in (caller holds the lock)"""
+        for cohort in self.memberships.pop(user_id, set()):
+            for metric in LEADERBOARD_METRICS:
+                self.indexes[(cohort, metric)].remove(user_id)
+    
+    def index(self, cohort, metric) -> RankIndex:
+        return self.indexes.get((cohort, metric)) or RankIndex()
+
+leaderboards = Leaderboards()
+
+def format_score(metric, score):
+    return round(score / 100, 2) if metric == 'accuracy' else score
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Top-N of a cohort for one metric, with the current user's rank"""
+    cohort = request.args.get('cohort', DEFAULT_COHORT)
+    metric = request.args.get('metric', 'solved')
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({'error': f'metric must be one of: {", ".join(LEADERBOARD_METRICS)}'}), 400
+    limit = get_page_size()
+    
+    conn = acquire_read_connection()
+    try:
+        leaderboards.refresh(conn.cursor())
+    finally:
+        release_read_connection(conn)
+    
+    index = leaderboards.index(cohort, metric)
+    rank = index.rank('default')
+    return jsonify({
+        'cohort': cohort,
+        'metric': metric,
+        'total': len(index),
+        'top': [{'rank': r, 'user_id': user_id, 'score': format_score(metric, score)}
+                for r, user_id, score in index.top(limit)],
+        'me': {'rank': rank, 'score': format_score(metric, index.score('default'))} if rank else None
+    })
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+def get_my_ranks():
+    """The current user's rank for every metric in each of their cohorts"""
+    conn = acquire_read_connection()
+    try:
+        leaderboards.refresh(conn.cursor())
+    finally:
+        release_read_connection(conn)
+    
+    ranks = {}
+    for cohort in sorted(leaderboards.memberships.get('default', {DEFAULT_COHORT})):
+        ranks[cohort] = {}
+        for metric in LEADERBOARD_METRICS:
+            index = leaderboards.index(cohort, metric)
+            score = index.score('default')
+            ranks[cohort][metric] = {
+                'rank': index.rank('default'),
+                'score': format_score(metric, score) if score is not None else None,
+                'total': len(index)
+            }
+    return jsonify({'user_id': 'default', 'cohorts': ranks})
+
+@app.route('/api/cohorts', methods=['POST'])
+def join_cohort():
+    """Join a cohort"""
+    data = request.get_json(silent=True) or {}
+    cohort = (data.get('cohort') or '').strip()
+    if not cohort or cohort == DEFAULT_COHORT or len(cohort) > MAX_COHORT_LENGTH:
+        return jsonify({'success': False, 'error': 'Invalid cohort name'}), 400
+    
+    try:
+        with writer_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                INSERT OR IGNORE INTO cohort_members (cohort, user_id) VALUES (?, 'default')
+            ''', (cohort,))
+            touch_user_score(c, 'default')
+            conn.commit()
+        return jsonify({'success': True})
+    except Exception as e:
+        print(f"Error joining cohort: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/cohorts/<cohort>', methods=['DELETE'])
+def leave_cohort(cohort):
+    """Leave a cohort"""
+    try:
+        with writer_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM cohort_members WHERE cohort = ? AND user_id = 'default'", (cohort,))
+            if c.rowcount == 0:
+                return jsonify({'success': False, 'error': 'Not a member of this cohort'}), 404
+            touch_user_score(c, 'default')
+            conn.commit()
+        return jsonify({'success': True})
+    except Exception as e:
+        print(f"Error leaving cohort: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Mock interview sampling: per-question weakness weights, one alias table per difficulty
+INTERVIEW_WEIGHTS = {
+    'new': 1.0,       # never attempted
+    'wrong': 4.0,     # last attempt was wrong
+    'overdue': 2.5,   # correct, but past its next review interval
+    'fresh': 0.25,    # correct and not yet due for review
+}
+DEFAULT_INTERVIEW_MIX = {'Easy': 1, 'Medium': 2, 'Hard': 1}
+DEFAULT_INTERVIEW_COUNT = 4
+MAX_INTERVIEW_COUNT = 20
+
+class AliasTable:
+    """Vose's alias method: O(n) setup, O(1) per weighted draw"""
+    
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.weights = list(weights)
+        n = len(self.items)
+        total = float(sum(weights))
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        scaled = [w * n / total for w in weights] if total > 0 else [1.0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def draw(self, rng):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+class InterviewSampler:
+    """Weakness weights for the default user, caught up from change_log on each draw"""
+    
+    def __init__(self):
+        self.catalogue = None
+        self.day = None
+        self.version = None
+        self.progress = {}      # question_id -> (completed_day, is_correct, review_count)
+        self.weights = {}       # question_id -> (weight, reason)
+        self.coverage = {}      # category -> [completed, total]
+        self.tables = {}        # difficulty -> AliasTable
+        self.dirty = set()      # difficulties whose alias table needs rebuilding
+        self.lock = threading.Lock()
+    
+    def refresh(self, c):
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM change_log')
+        latest = c.fetchone()[0]
+        catalogue = get_catalogue()
+        today = user_today()
+        with self.lock:
+            if catalogue is not self.catalogue or today != self.day:
+                # Due dates move daily and the question set may change: rebuild everything
+                self._rebuild(c, catalogue, today, latest)
+            elif latest != self.version:
+                self._apply_changes(c, latest)
+    
+    def _rebuild(self, c, catalogue, today, latest):
+        self.catalogue, self.day, self.version = catalogue, today, latest
+        c.execute('''
+            SELECT question_id, completed_day, is_correct, review_count
+            FROM progress WHERE user_id = 'default'
+        ''')
+        self.progress = {row[0]: row[1:] for row in c.fetchall()}
+        self.coverage = {}
+        for qid in catalogue.ids():
+            counts = self.coverage.setdefault(catalogue.get(qid).category, [0, 0])
+            counts[1] += 1
+            if self._completed(qid):
+                counts[0] += 1
+        self.weights = {}
+        for qid in catalogue.ids():
+            self.weights[qid] = self._weight(qid)
+        self.tables = {}
+        self.dirty = set(catalogue.difficulties())
+    
+    def _apply_changes(self, c, latest):
+        c.execute('''
+            SELECT DISTINCT question_id FROM change_log
+            WHERE version > ? AND user_id = 'default'
+        ''', (self.version,))
+        changed = [row[0] for row in c.fetchall() if row[0] in self.catalogue]
+        self.version = latest
         
-        c.execute('SELECT COUNT(*) FROM progress WHERE is_correct = 1')
-        correct = c.fetchone()[0]
+        touched_categories = set()
+        for qid in changed:
+            was_completed = self._completed(qid)
+            c.execute('''
+                SELECT completed_day, is_correct, review_count
+                FROM progress WHERE question_id = ? AND user_id = 'default'
+            ''', (qid,))
+            row = c.fetchone()
+            if row:
+                self.progress[qid] = row
+            else:
+                self.progress.pop(qid, None)
+            
+            category = self.catalogue.get(qid).category
+            delta = self._completed(qid) - was_completed
+            if delta:
+                self.coverage[category][0] += delta
+                touched_categories.add(category)
+            self.weights[qid] = self._weight(qid)
+            self.dirty.add(self.catalogue.get(qid).difficulty)
         
-        c.execute('SELECT COUNT(*) FROM progress WHERE is_correct = 0')
-        wrong = c.fetchone()[0]
+        # Coverage feeds every weight in the category
+        for category in touched_categories:
+            for qid in self.catalogue.ids_for_category(category):
+                self.weights[qid] = self._weight(qid)
+                self.dirty.add(self.catalogue.get(qid).difficulty)
+    
+    def _completed(self, qid):
+        state = self.progress.get(qid)
+        return bool(state and state[0] is not None)
+    
+    def _weight(self, qid):
+        """(weight, reason): status factor scaled up for thinly covered categories"""
+        state = self.progress.get(qid)
+        if not state or state[0] is None:
+            reason = 'new'
+        elif not state[1]:
+            reason = 'wrong'
+        else:
+            completed_day, _, review_count = state
+            interval = REVIEW_INTERVALS[min(review_count or 0, len(REVIEW_INTERVALS) - 1)]
+            days_since = epoch_day(self.day) - completed_day
+            reason = 'overdue' if days_since >= interval else 'fresh'
         
-        c.execute('''
-            INSERT OR REPLACE INTO statistics (id, total_completed, total_correct, total_wrong, updated_at)
-            VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (total, correct, wrong))
+        completed, total = self.coverage[self.catalogue.get(qid).category]
+        coverage = completed / total if total else 1.0
+        return INTERVIEW_WEIGHTS[reason] * (2.0 - coverage), reason
+    
+    def table(self, difficulty) -> Optional[AliasTable]:
+        """Alias table for one difficulty, rebuilt only if its weights changed"""
+        with self.lock:
+            if difficulty in self.dirty:
+                ids = self.catalogue.ids_for_difficulty(difficulty)
+                self.tables[difficulty] = AliasTable(ids, [self.weights[qid][0] for qid in ids])
+                self.dirty.discard(difficulty)
+            return self.tables.get(difficulty)
+
+interview_sampler = InterviewSampler()
+
+def parse_interview_mix(value, count):
+    """Per-difficulty question counts from 'Easy:1,Medium:2' or the default ratio"""
+    if value:
+        mix = {}
+        for part in value.split(','):
+            difficulty, _, n = part.partition(':')
+            if not n.isdigit():
+                raise ValueError('mix must look like Easy:1,Medium:2,Hard:1')
+            mix[difficulty.strip()] = int(n)
+        return mix
+    
+    # Largest-remainder split of count across the default ratio
+    ratio_total = sum(DEFAULT_INTERVIEW_MIX.values())
+    shares = {d: count * r / ratio_total for d, r in DEFAULT_INTERVIEW_MIX.items()}
+    mix = {d: int(share) for d, share in shares.items()}
+    for d in sorted(shares, key=lambda d: shares[d] - mix[d], reverse=True)[:count - sum(mix.values())]:
+        mix[d] += 1
+    return mix
+
+def draw_distinct(table, k, rng):
+    """k distinct weighted draws; falls back to heaviest remaining if rejections pile up"""
+    k = min(k, len(table))
+    picked = []
+    seen = set()
+    attempts = 0
+    while len(picked) < k and attempts < 20 * k:
+        attempts += 1
+        qid = table.draw(rng)
+        if qid not in seen:
+            seen.add(qid)
+            picked.append(qid)
+    if len(picked) < k:
+        # prob is the alias threshold, not the weight; rank by the weights the table was built from
+        remaining = [(table.weights[i], qid) for i, qid in enumerate(table.items) if qid not in seen]
+        picked.extend(qid for _, qid in sorted(remaining, reverse=True)[:k - len(picked)])
+    return picked
+
+@app.route('/api/interview', methods=['GET'])
+def get_mock_interview():
+    """Draw a mock interview weighted toward weak spots"""
+    count = request.args.get('count', DEFAULT_INTERVIEW_COUNT, type=int)
+    count = max(1, min(count, MAX_INTERVIEW_COUNT))
+    try:
+        mix = parse_interview_mix(request.args.get('mix'), count)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if sum(mix.values()) > MAX_INTERVIEW_COUNT:
+        return jsonify({'error': f'At most {MAX_INTERVIEW_COUNT} questions per interview'}), 400
+    seed = request.args.get('seed', type=int)
+    rng = random.Random(seed)
+    
+    conn = acquire_read_connection()
+    try:
+        interview_sampler.refresh(conn.cursor())
+    finally:
+        release_read_connection(conn)
+    
+    catalogue = interview_sampler.catalogue
+    questions = []
+    for difficulty, n in mix.items():
+        table = interview_sampler.table(difficulty)
+        if not table or n <= 0:
+            continue
+        for qid in draw_distinct(table, n, rng):
+            q_dict = catalogue.get(qid).to_dict()
+            weight, reason = interview_sampler.weights[qid]
+            q_dict['weight'] = round(weight, 3)
+            q_dict['reason'] = reason
+            questions.append(q_dict)
+    
+    return jsonify({'mix': mix, 'total': len(questions), 'questions': questions})
+
+def admin_authorized():
+    """Admin endpoints need ADMIN_TOKEN configured and a matching X-Admin-Token header"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.route('/api/admin/maintenance', methods=['GET'])
+def get_maintenance_status():
+    """Database and WAL sizes, free pages and the last maintenance run"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    stats = maintenance.database_stats(DATABASE)
+    stats['wal_size_limit'] = WAL_SIZE_LIMIT
+    stats['backups'] = sorted(os.path.basename(p) for p in Path(BACKUP_DIR).glob('*.db'))
+    stats['last_run'] = _maintenance_state['last_run']
+    stats['last_backup'] = _maintenance_state['last_backup']
+    return jsonify(stats)
+
+@app.route('/api/admin/maintenance', methods=['POST'])
+def run_maintenance_tasks():
+    """Run maintenance tasks now, e.g. {"tasks": ["backup", "checkpoint"]}"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    tasks = data.get('tasks') or ['checkpoint', 'vacuum', 'optimize']
+    unknown = [t for t in tasks if t not in maintenance.MAINTENANCE_TASKS]
+    if unknown:
+        return jsonify({'success': False, 'error': f'Unknown tasks: {", ".join(map(str, unknown))}'}), 400
+    try:
+        results = run_scheduled_maintenance(tasks)
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        print(f"Error running maintenance: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+_maintenance_state = {'last_run': None, 'last_backup': None}
+_maintenance_lock = threading.Lock()
+
+def run_scheduled_maintenance(tasks):
+    """Run maintenance tasks, one pass at a time per process"""
+    with _maintenance_lock:
+        results = maintenance.run_maintenance(DATABASE, tasks, BACKUP_DIR, BACKUP_KEEP)
+        now = datetime.now().isoformat(timespec='seconds')
+        _maintenance_state['last_run'] = now
+        if 'backup' in tasks:
+            _maintenance_state['last_backup'] = now
+        return results
+
+# Background jobs: each node polls scheduled_jobs, takes a lease on a due job so
+# no other node runs it, and hands it to a worker thread
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '2'))
+SCHEDULER_POLL_INTERVAL = float(os.environ.get('SCHEDULER_POLL_INTERVAL', '30'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '900'))
+# Seconds after local midnight at which the daily jobs run
+NIGHTLY_JOB_DELAY = int(os.environ.get('NIGHTLY_JOB_DELAY', '300'))
+
+def next_daily_run(now, offset):
+    """Epoch seconds of the next midnight + offset after now, in the learner's timezone"""
+    midnight = datetime.fromtimestamp(now, get_user_timezone()).replace(hour=0, minute=0, second=0, microsecond=0)
+    run_at = midnight + timedelta(seconds=offset)
+    if run_at.timestamp() <= now:
+        run_at = midnight + timedelta(days=1, seconds=offset)
+    return run_at.timestamp()
+
+class Job:
+    """A named job run every `every` seconds, or daily `daily_at` seconds after local midnight"""
+    
+    def __init__(self, name, func, every=None, daily_at=None):
+        self.name = name
+        self.func = func
+        self.every = every
+        self.daily_at = daily_at
+    
+    @property
+    def schedule(self):
+        return f'daily+{self.daily_at}s' if self.daily_at is not None else f'every {self.every}s'
+    
+    def next_run(self, now):
+        if self.daily_at is not None:
+            return next_daily_run(now, self.daily_at)
+        return now + self.every
+
+class Scheduler:
+    """In-process job runner with job state and leases persisted in scheduled_jobs"""
+    
+    def __init__(self, workers=SCHEDULER_WORKERS, poll_interval=SCHEDULER_POLL_INTERVAL,
+                 lease_seconds=JOB_LEASE_SECONDS):
+        self.jobs = {}
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}'
+        self.queue = queue.Queue()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+    
+    def register(self, job, run_first=False):
+        """Add a job; daily jobs and run_first jobs are due immediately the first time they are seen"""
+        self.jobs[job.name] = job
+        now = time.time()
+        first_run = now if run_first or job.daily_at is not None else job.next_run(now)
+        with writer_connection() as conn:
+            # A changed schedule replaces the stored next run
+            conn.execute('''
+                INSERT INTO scheduled_jobs (name, schedule, next_run)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    schedule = excluded.schedule,
+                    next_run = excluded.next_run
+                WHERE scheduled_jobs.schedule != excluded.schedule
+            ''', (job.name, job.schedule, first_run))
+            conn.commit()
+    
+    def claim_due_jobs(self):
+        """Lease every due job no other node holds; returns the names claimed"""
+        now = time.time()
+        claimed = []
+        with writer_connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT name FROM scheduled_jobs WHERE next_run <= ? AND lease_expires < ?', (now, now))
+            for (name,) in c.fetchall():
+                if name not in self.jobs:
+                    continue  # Registered by a node running other code
+                # The lease is taken with a conditional update, so only one node wins
+                c.execute('''
+                    UPDATE scheduled_jobs SET lease_owner = ?, lease_expires = ?
+                    WHERE name = ? AND next_run <= ? AND lease_expires < ?
+                ''', (self.owner, now + self.lease_seconds, name, now, now))
+                if c.rowcount == 1:
+                    claimed.append(name)
+                conn.commit()
+        return claimed
+    
+    def run_job(self, name):
+        """Run a leased job and record its outcome, releasing the lease"""
+        job = self.jobs[name]
+        started = time.perf_counter()
+        started_at = datetime.now().isoformat(timespec='seconds')
+        try:
+            job.func()
+            status, error = 'ok', None
+        except Exception as e:
+            print(f"Warning: job {name} failed: {e}")
+            status, error = 'failed', str(e)
+        duration_ms = int((time.perf_counter() - started) * 1000)
         
+        with writer_connection() as conn:
+            conn.execute('''
+                UPDATE scheduled_jobs
+                SET next_run = ?, last_started = ?, last_finished = ?, last_status = ?,
+                    last_error = ?, last_duration_ms = ?, run_count = run_count + 1,
+                    lease_owner = NULL, lease_expires = 0
+                WHERE name = ? AND lease_owner = ?
+            ''', (job.next_run(time.time()), started_at, datetime.now().isoformat(timespec='seconds'),
+                  status, error, duration_ms, name, self.owner))
+            conn.commit()
+        return status
+    
+    def trigger(self, name):
+        """Make a job due now; whichever node polls first runs it"""
+        with writer_connection() as conn:
+            c = conn.execute('UPDATE scheduled_jobs SET next_run = ? WHERE name = ?', (time.time(), name))
+            conn.commit()
+            found = c.rowcount == 1
+        self.wakeup.set()
+        return found
+    
+    def dispatch_loop(self):
+        while not self.stopping.is_set():
+            try:
+                for name in self.claim_due_jobs():
+                    self.queue.put(name)
+            except sqlite3.Error as e:
+                print(f"Warning: scheduler poll failed: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+    
+    def worker_loop(self):
+        while True:
+            name = self.queue.get()
+            if name is None:
+                return
+            self.run_job(name)
+    
+    def start(self):
+        threads = [threading.Thread(target=self.dispatch_loop, name='scheduler', daemon=True)]
+        threads += [threading.Thread(target=self.worker_loop, name=f'job-worker-{i}', daemon=True)
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        self.threads = threads
+    
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        for _ in range(self.workers):
+            self.queue.put(None)
+
+scheduler = None
+
+def plan_state_key(c):
+    """Everything a day's plan depends on besides the date: progress, catalogue, start date, timezone"""
+    c.execute('''
+        SELECT (SELECT COALESCE(MAX(version), 0) FROM change_log),
+               (SELECT setting_value FROM user_settings WHERE setting_key = 'catalogue_hash'),
+               (SELECT setting_value FROM user_settings WHERE setting_key = 'start_date'),
+               (SELECT setting_value FROM user_settings WHERE setting_key = 'timezone')
+    ''')
+    return ':'.join(str(value) for value in c.fetchone())
+
+# The current plan_state_key, cached per process. PRAGMA data_version on a dedicated
+# connection changes whenever any other connection commits (this process's writer
+# included), so progress written by any worker drops the cached key
+_plan_state = {'conn': None, 'database': None, 'data_version': None, 'key': None}
+_plan_state_lock = threading.Lock()
+
+def current_plan_state_key():
+    """plan_state_key of the latest committed state, recomputed only after a commit"""
+    with _plan_state_lock:
+        if _plan_state['conn'] is None or _plan_state['database'] != DATABASE:
+            if _plan_state['conn'] is not None:
+                _plan_state['conn'].close()
+            _plan_state.update(conn=open_read_connection(), database=DATABASE, data_version=None)
+        conn = _plan_state['conn']
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != _plan_state['data_version']:
+            _plan_state['key'] = plan_state_key(conn.cursor())
+            _plan_state['data_version'] = data_version
+        return _plan_state['key']
+
+def load_plan_bundle(c, day):
+    """Today's precomputed plan for day, if one exists and nothing it depends on has changed"""
+    c.execute('''
+        SELECT payload, state_key FROM plan_bundles
+        WHERE user_id = 'default' AND bundle_date = ? AND study_day = ?
+    ''', (user_today().isoformat(), day))
+    row = c.fetchone()
+    if row is None or row[1] != current_plan_state_key():
+        return None
+    return json.loads(row[0])
+
+def precompute_today_bundle():
+    """Build today's plan (carry-overs, due reviews, counts) ahead of the first request"""
+    catalogue = get_catalogue()
+    day = get_current_day()
+    today = user_today().isoformat()
+    with read_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        # One snapshot for both, read with the state key first: a write racing with
+        # the build invalidates the bundle
+        c.execute('BEGIN')
+        state_key = plan_state_key(c)
+        plan = build_plan(c, day, catalogue)
+    with writer_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            INSERT INTO plan_bundles (user_id, bundle_date, study_day, state_key, payload)
+            VALUES ('default', ?, ?, ?, ?)
+            ON CONFLICT(user_id, bundle_date) DO UPDATE SET
+                study_day = excluded.study_day,
+                state_key = excluded.state_key,
+                payload = excluded.payload,
+                created_at = CURRENT_TIMESTAMP
+        ''', (today, day, state_key, json.dumps(plan)))
+        c.execute('DELETE FROM plan_bundles WHERE bundle_date < ?', (today,))
+        conn.commit()
+
+def reset_broken_streaks():
+    """Zero the stored streak once a full day passes without study, so leaderboards see it"""
+    yesterday = (user_today() - timedelta(days=1)).isoformat()
+    with writer_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE statistics SET streak_days = 0
+            WHERE streak_days > 0 AND (last_study_date IS NULL OR last_study_date < ?)
+        ''', (yesterday,))
+        if c.rowcount:
+            record_user_score(c)
+        conn.commit()
+
+def prune_change_log():
+    """Drop change-log rows superseded by a later write to the same question.
+    
+    Sync only sends each question's latest version after a cursor, so whatever
+    cursor a client holds, it gets the same changes from the pruned log.
+    """
+    with writer_connection() as conn:
+        conn.execute('''
+            DELETE FROM change_log WHERE version NOT IN (
+                SELECT MAX(version) FROM change_log GROUP BY user_id, question_id
+            )
+        ''')
         conn.commit()
+
+_scheduler_lock = threading.Lock()
+_scheduler_state = {'started': False}
+
+def start_scheduler():
+    """Register the nightly and maintenance jobs and start the scheduler threads"""
+    global scheduler
+    if not SCHEDULER_ENABLED:
+        return None
+    scheduler = Scheduler()
+    scheduler.register(Job('streak_reset', reset_broken_streaks, daily_at=NIGHTLY_JOB_DELAY))
+    scheduler.register(Job('stats_rollup', update_statistics, daily_at=NIGHTLY_JOB_DELAY))
+    scheduler.register(Job('change_log_prune', prune_change_log, daily_at=NIGHTLY_JOB_DELAY))
+    # Runs after the two above so the bundle sees the reset streaks and fresh totals
+    scheduler.register(Job('today_bundle', precompute_today_bundle, daily_at=NIGHTLY_JOB_DELAY + 60))
+    if MAINTENANCE_INTERVAL > 0:
+        scheduler.register(Job('maintenance', lambda: run_scheduled_maintenance(['checkpoint', 'vacuum', 'optimize']),
+                               every=MAINTENANCE_INTERVAL))
+    if BACKUP_INTERVAL > 0:
+        scheduler.register(Job('backup', lambda: run_scheduled_maintenance(['backup']), every=BACKUP_INTERVAL))
+    scheduler.start()
+    return scheduler
+
+def ensure_scheduler():
+    """Start this process's scheduler once"""
+    with _scheduler_lock:
+        if _scheduler_state['started']:
+            return
+        _scheduler_state['started'] = True
+        try:
+            start_scheduler()
+        except Exception as e:
+            print(f"Warning: Failed to start scheduler: {e}")
+
+@app.before_request
+def start_scheduler_on_first_request():
+    """Each serving process starts its scheduler with its first request.
+    
+    That covers gunicorn workers (after the fork, so the threads exist in the worker)
+    and flask run with or without the reloader. The reloader's watcher process and
+    manage.py import the app without serving, so they never run jobs.
+    """
+    if not _scheduler_state['started']:
+        ensure_scheduler()
+
+@app.route('/api/admin/jobs', methods=['GET'])
+def list_jobs():
+    """Scheduled jobs with their next run, last outcome and current lease holder"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    conn = acquire_read_connection()
+    try:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        c.execute('SELECT * FROM scheduled_jobs ORDER BY name')
+        jobs = []
+        for row in c.fetchall():
+            job = dict(row)
+            job['next_run'] = datetime.fromtimestamp(job['next_run']).isoformat(timespec='seconds')
+            job['running'] = job['lease_expires'] > time.time()
+            del job['lease_expires']
+            jobs.append(job)
     finally:
-        conn.close()
+        release_read_connection(conn)
+    return jsonify({'jobs': jobs})
+
+@app.route('/api/admin/jobs/<name>/run', methods=['POST'])
+def run_job_now(name):
+    """Make a job due now"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    if scheduler is None:
+        return jsonify({'success': False, 'error': 'Scheduler is not running in this process'}), 400
+    if not scheduler.trigger(name):
+        return jsonify({'success': False, 'error': f'Unknown job: {name}'}), 404
+    return jsonify({'success': True})
+
+def update_statistics(conn=None):
+    """Update statistics, optionally inside the caller's open transaction"""
+    if conn is None:
+        with writer_connection() as conn:
+            update_statistics(conn)
+            conn.commit()
+        return
+    with closing(get_storage(conn)) as store:
+        store.save_statistics(**store.completion_totals())
+    record_user_score(conn.cursor())
 
 if __name__ == '__main__':
-    init_db()
-    populate_questions()
+    initialize_database()
+    # The reloader runs this block in two processes; the serving child starts its
+    # jobs now rather than with its first request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ensure_scheduler()
     print("=" * 60)
     print("🚀 LeetCode 30-Day Study Plan System Started!")
     print("=" * 60)
@@ -0,0 +1,137 @@
+"""
+SQLite maintenance: online backups, WAL checkpoints, incremental vacuum and
+planner statistics. Used by manage.py, the admin endpoint and the scheduled
+maintenance and backup jobs in app.py.
+"""
+
+import glob
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict
+
+# Pages freed per incremental vacuum run (0 frees the whole freelist)
+VACUUM_PAGES = 1000
+MAINTENANCE_TASKS = ('backup', 'checkpoint', 'vacuum', 'optimize', 'analyze')
+
+
+def connect(db_path, timeout=10.0):
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def backup_database(db_path, backup_dir, keep=7) -> Dict:
+    """Copy the live database with the backup API, then prune all but the newest keep backups"""
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    target = os.path.join(backup_dir, f'{name}-{stamp}.db')
+    tmp_target = f'{target}.tmp'
+
+    started = time.perf_counter()
+    src = connect(db_path)
+    try:
+        dest = sqlite3.connect(tmp_target)
+        try:
+            # One step, so the copy is a single read transaction: under WAL writers
+            # carry on meanwhile. A stepped copy restarts from page 1 whenever
+            # another connection writes, and may never finish under steady writes
+            src.backup(dest, pages=-1)
+            # A backup is a single self-contained file
+            dest.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dest.close()
+    finally:
+        src.close()
+    os.replace(tmp_target, target)
+
+    backups = sorted(glob.glob(os.path.join(backup_dir, f'{name}-*.db')))
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+
+    return {
+        'path': target,
+        'bytes': os.path.getsize(target),
+        'seconds': round(time.perf_counter() - started, 3),
+        'pruned': len(removed)
+    }
+
+
+def checkpoint_wal(conn, mode='TRUNCATE') -> Dict:
+    """Checkpoint the WAL; TRUNCATE also shrinks the file to zero bytes when it completes"""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f'Invalid checkpoint mode: {mode}')
+    busy, log_frames, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    return {'mode': mode, 'busy': bool(busy), 'log_frames': log_frames, 'checkpointed_frames': checkpointed}
+
+
+def enable_incremental_vacuum(conn) -> bool:
+    """Switch the database to auto_vacuum=INCREMENTAL; returns True if it had to rebuild.
+
+    Changing auto_vacuum on a populated database needs one full VACUUM, which
+    holds the write lock while it rewrites the file.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES) -> Dict:
+    """Return up to pages free pages to the OS (needs auto_vacuum=INCREMENTAL)"""
+    mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if mode == 2:
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {'auto_vacuum': ('none', 'full', 'incremental')[mode], 'freed_pages': before - after,
+            'free_pages': after}
+
+
+def optimize(conn, analyze=False) -> Dict:
+    """Refresh planner statistics: PRAGMA optimize, or a full ANALYZE when asked"""
+    started = time.perf_counter()
+    conn.execute('ANALYZE' if analyze else 'PRAGMA optimize')
+    return {'analyze': analyze, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def database_stats(db_path) -> Dict:
+    """File sizes and page counts for the database and its WAL"""
+    wal_path = f'{db_path}-wal'
+    conn = connect(db_path)
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        'database_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'free_pages': free_pages
+    }
+
+
+def run_maintenance(db_path, tasks, backup_dir=None, keep=7) -> Dict:
+    """Run the named tasks in order: backup, vacuum, optimize/analyze, then checkpoint"""
+    results = {}
+    if 'backup' in tasks:
+        results['backup'] = backup_database(db_path, backup_dir, keep)
+    conn = connect(db_path)
+    try:
+        if 'vacuum' in tasks:
+            results['vacuum'] = incremental_vacuum(conn)
+        if 'optimize' in tasks or 'analyze' in tasks:
+            results['optimize'] = optimize(conn, analyze='analyze' in tasks)
+        # Checkpoint last so the WAL written by the tasks above is folded back too
+        if 'checkpoint' in tasks:
+            results['checkpoint'] = checkpoint_wal(conn)
+    finally:
+        conn.close()
+    return results
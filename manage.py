@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Command-line administration for the study plan database.
+
+    python manage.py backup [--dir DIR] [--keep N]
+    python manage.py checkpoint [--mode PASSIVE|FULL|RESTART|TRUNCATE]
+    python manage.py vacuum [--pages N] [--full]
+    python manage.py optimize [--analyze]
+    python manage.py stats
+    python manage.py maintain [--tasks backup,checkpoint,vacuum,optimize]
+
+    python manage.py seed [--reseed]
+    python manage.py reset-progress --yes
+    python manage.py migrate-user FROM TO
+    python manage.py recompute-stats
+    python manage.py export [--out FILE]
+    python manage.py import FILE [--replace]
+    python manage.py check [--fix]
+
+Everything runs online against the live database; the server can keep serving.
+Bulk commands stream progress and throughput to stderr and print a JSON
+summary to stdout. --database points any command at another database file.
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import maintenance
+import app
+from app import BACKUP_DIR, BACKUP_KEEP
+
+# Rows per executemany batch for bulk writes
+BATCH_SIZE = 1000
+EXPORT_FORMAT = 'leetcode-plan-export'
+EXPORT_VERSION = 1
+# Per-user tables carried by export/import, in load order; derived tables are recomputed
+EXPORT_TABLES = ('progress', 'attempts', 'timing_events', 'question_time', 'practice_sets')
+EXPORT_SETTINGS = ('start_date', 'timezone')
+# Per-user tables migrate moves to the new user id
+USER_TABLES = ('progress', 'attempts', 'timing_events', 'question_time', 'change_log',
+               'practice_sets', 'cohort_members')
+# Per-user tables derived from the ones above; migrate drops and recomputes them.
+# user_scores rows are tombstoned with app.remove_user_score instead, so leaderboards drop the user
+DERIVED_TABLES = ('daily_rollups', 'statistics', 'plan_bundles')
+# The only user the app serves; statistics, streaks and settings belong to it
+DEFAULT_USER = 'default'
+# Tables whose rows point at questions. Rows left behind when a question leaves the
+# catalogue are kept as history, as sync_questions keeps them; check only reports them
+QUESTION_TABLES = ('progress', 'attempts', 'timing_events', 'question_time')
+
+
+class Throughput:
+    """Counts processed rows and reports the running rate to stderr"""
+
+    def __init__(self, label, interval=0.5):
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.started = self.reported = time.perf_counter()
+
+    def add(self, n=1):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self._report(now, end='\r' if sys.stderr.isatty() else '\n')
+
+    def done(self):
+        now = time.perf_counter()
+        self._report(now, end='\n')
+        seconds = now - self.started
+        return {'rows': self.count, 'seconds': round(seconds, 3),
+                'rows_per_second': round(self.count / seconds) if seconds > 0 else None}
+
+    def _report(self, now, end):
+        elapsed = now - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0
+        print(f"{self.label}: {self.count} rows ({rate:,.0f} rows/s)", end=end, file=sys.stderr, flush=True)
+
+
+def table_columns(c, table):
+    return [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+
+
+def cmd_backup(args):
+    return maintenance.backup_database(app.DATABASE, args.dir, args.keep)
+
+
+def cmd_checkpoint(args):
+    conn = maintenance.connect(app.DATABASE)
+    try:
+        return maintenance.checkpoint_wal(conn, args.mode)
+    finally:
+        conn.close()
+
+
+def cmd_vacuum(args):
+    conn = maintenance.connect(app.DATABASE)
+    try:
+        result = {}
+        if args.full:
+            result['rebuilt'] = maintenance.enable_incremental_vacuum(conn)
+        result.update(maintenance.incremental_vacuum(conn, args.pages))
+        return result
+    finally:
+        conn.close()
+
+
+def cmd_optimize(args):
+    conn = maintenance.connect(app.DATABASE)
+    try:
+        return maintenance.optimize(conn, args.analyze)
+    finally:
+        conn.close()
+
+
+def cmd_stats(args):
+    return maintenance.database_stats(app.DATABASE)
+
+
+def cmd_maintain(args):
+    tasks = [t.strip() for t in args.tasks.split(',') if t.strip()]
+    unknown = [t for t in tasks if t not in maintenance.MAINTENANCE_TASKS]
+    if unknown:
+        raise ValueError(f'Unknown tasks: {", ".join(unknown)}')
+    return maintenance.run_maintenance(app.DATABASE, tasks, args.dir, args.keep)
+
+
+def cmd_seed(args):
+    """Create or upgrade the schema and seed data; --reseed re-imports questions.json and the plans"""
+    started = time.perf_counter()
+    app.initialize_database()
+    if args.reseed:
+        app.reload_questions_if_changed(force=True)
+    conn = app.get_db_connection()
+    try:
+        questions = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        plans = conn.execute('SELECT COUNT(*) FROM daily_plans').fetchone()[0]
+    finally:
+        conn.close()
+    return {'questions': questions, 'daily_plans': plans,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def delete_user_rows(c, user_id, tables):
+    """Delete a user's rows from tables, returns {table: rows deleted}"""
+    deleted = {}
+    for table in tables:
+        c.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+        deleted[table] = c.rowcount
+    return deleted
+
+
+def require_default_user(user_id):
+    """The app reads progress, plans, statistics and settings for the default user only,
+    so rows written under any other user id would leak into or skew those reads"""
+    if user_id != DEFAULT_USER:
+        raise ValueError(f'Only the {DEFAULT_USER!r} user is supported; the app has no per-user reads yet')
+
+
+def recompute_statistics(c):
+    """Rebuild the default user's rollups, streaks, totals and leaderboard score from the attempt log"""
+    app.rebuild_rollups(c, DEFAULT_USER)
+    app.rebuild_streak(c)
+    app.update_statistics(c.connection)
+
+
+def cmd_reset_progress(args):
+    if not args.yes:
+        raise ValueError('This deletes all progress; pass --yes to confirm')
+    conn = app.get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        # Deleted progress rows reach change_log through its triggers, so clients sync the reset
+        deleted = delete_user_rows(c, DEFAULT_USER, ('progress', 'attempts', 'timing_events',
+                                                  'question_time', 'daily_rollups', 'plan_bundles'))
+        recompute_statistics(c)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'user': DEFAULT_USER, 'deleted': deleted}
+
+
+def cmd_migrate_user(args):
+    """Move every per-user row from another user id to the default user in one transaction"""
+    require_default_user(args.target)
+    if args.source == args.target:
+        raise ValueError('Source and target are the same user')
+    conn = app.get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        for table in ('progress', 'attempts'):
+            c.execute(f'SELECT 1 FROM {table} WHERE user_id = ? LIMIT 1', (args.target,))
+            if c.fetchone():
+                raise ValueError(f'User {args.target} already has {table} rows; reset them first')
+        progress = Throughput(f'migrate {args.source} -> {args.target}')
+        moved = {}
+        for table in USER_TABLES:
+            try:
+                c.execute(f'UPDATE {table} SET user_id = ? WHERE user_id = ?', (args.target, args.source))
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f'Cannot move {table} rows: {e}') from e
+            moved[table] = c.rowcount
+            progress.add(c.rowcount)
+        delete_user_rows(c, args.source, DERIVED_TABLES)
+        app.remove_user_score(c, args.source)
+        delete_user_rows(c, args.target, ('plan_bundles',))
+        recompute_statistics(c)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'moved': moved, **progress.done()}
+
+
+def cmd_recompute_stats(args):
+    started = time.perf_counter()
+    conn = app.get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        recompute_statistics(c)
+        attempts = c.execute('SELECT COUNT(*) FROM attempts').fetchone()[0]
+        c.execute('SELECT total_completed, total_correct, total_wrong, streak_days, longest_streak '
+                  'FROM statistics WHERE id = 1')
+        row = c.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    seconds = time.perf_counter() - started
+    keys = ('total_completed', 'total_correct', 'total_wrong', 'streak_days', 'longest_streak')
+    return {'statistics': dict(zip(keys, row or (0,) * len(keys))), 'attempts_replayed': attempts,
+            'seconds': round(seconds, 3)}
+
+
+def cmd_export(args):
+    """Stream the default user's progress, attempts, timers, practice sets and settings as JSON lines"""
+    out = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    conn = app.get_db_connection()
+    try:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        progress = Throughput('export')
+        out.write(json.dumps({'format': EXPORT_FORMAT, 'version': EXPORT_VERSION, 'user_id': DEFAULT_USER,
+                              'exported_at': datetime.now().isoformat(timespec='seconds')}) + '\n')
+        # One read transaction so the export is a consistent snapshot
+        c.execute('BEGIN')
+        counts = {}
+        for table in EXPORT_TABLES:
+            order = 'rowid' if table != 'question_time' else 'question_id'
+            c.execute(f'SELECT * FROM {table} WHERE user_id = ? ORDER BY {order}', (DEFAULT_USER,))
+            counts[table] = 0
+            while True:
+                rows = c.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                out.write(''.join(json.dumps({'table': table, 'row': dict(row)}) + '\n' for row in rows))
+                counts[table] += len(rows)
+                progress.add(len(rows))
+        placeholders = ','.join('?' * len(EXPORT_SETTINGS))
+        c.execute(f'SELECT setting_key, setting_value FROM user_settings WHERE setting_key IN ({placeholders})',
+                  EXPORT_SETTINGS)
+        for key, value in c.fetchall():
+            out.write(json.dumps({'table': 'user_settings', 'row': {'setting_key': key, 'setting_value': value}}) + '\n')
+        conn.rollback()
+    finally:
+        conn.close()
+        if out is not sys.stdout:
+            out.close()
+    return {'tables': counts, **progress.done()}
+
+
+def cmd_import(args):
+    """Load an export into the default user in batched inserts, then recompute derived tables"""
+    # Also restores the exported start date and timezone settings
+    conn = app.get_db_connection()
+    try:
+        c = conn.cursor()
+        columns = {table: set(table_columns(c, table)) for table in EXPORT_TABLES}
+        c.execute('BEGIN IMMEDIATE')
+        if args.replace:
+            delete_user_rows(c, DEFAULT_USER, EXPORT_TABLES + ('daily_rollups', 'plan_bundles'))
+        else:
+            c.execute('SELECT 1 FROM progress WHERE user_id = ? LIMIT 1', (DEFAULT_USER,))
+            if c.fetchone():
+                raise ValueError(f'User {DEFAULT_USER} already has progress; use --replace to overwrite it')
+
+        progress = Throughput('import')
+        counts = {}
+        pending = {}
+
+        def flush(table):
+            rows = pending.pop(table, [])
+            if not rows:
+                return
+            keys = list(rows[0])
+            c.executemany(f'INSERT INTO {table} ({", ".join(keys)}) VALUES ({", ".join("?" * len(keys))})',
+                          [tuple(row.get(k) for k in keys) for row in rows])
+            counts[table] = counts.get(table, 0) + len(rows)
+            progress.add(len(rows))
+
+        with open(args.file, encoding='utf-8') as f:
+            header = json.loads(f.readline() or 'null')
+            if not isinstance(header, dict) or header.get('format') != EXPORT_FORMAT:
+                raise ValueError(f'{args.file} is not a study plan export')
+            if header.get('version', 0) > EXPORT_VERSION:
+                raise ValueError(f'Export version {header["version"]} is newer than this tool supports')
+            for line_number, line in enumerate(f, start=2):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                table, row = record.get('table'), record.get('row') or {}
+                if table == 'user_settings':
+                    if row.get('setting_key') in EXPORT_SETTINGS:
+                        c.execute('INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+                                  (row['setting_key'], row['setting_value']))
+                    continue
+                if table not in EXPORT_TABLES:
+                    raise ValueError(f'Line {line_number}: unknown table {table!r}')
+                # Fresh ids keep exported order without colliding with existing rows
+                row = {k: v for k, v in row.items() if k in columns[table] and k != 'id'}
+                row['user_id'] = DEFAULT_USER
+                if table == 'practice_sets':
+                    row['share_token'] = secrets.token_urlsafe(9)
+                batch = pending.setdefault(table, [])
+                if batch and list(batch[0]) != list(row):
+                    flush(table)  # Column set changed, start a new batch
+                    batch = pending.setdefault(table, [])
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    flush(table)
+        for table in list(pending):
+            flush(table)
+
+        # Older exports have no epoch-day columns
+        c.execute(f'''
+            UPDATE progress
+            SET completed_day = {app.EPOCH_DAY_SQL.format('completed_date')},
+                last_review_day = {app.EPOCH_DAY_SQL.format('last_review_date')}
+            WHERE user_id = ? AND completed_date IS NOT NULL AND completed_day IS NULL
+        ''', (DEFAULT_USER,))
+        recompute_statistics(c)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'user': DEFAULT_USER, 'tables': counts, **progress.done()}
+
+
+def find_problems(c):
+    """Run each integrity check, yielding (name, count, sample) as it finishes"""
+    c.execute('PRAGMA quick_check')
+    messages = [row[0] for row in c.fetchall()]
+    yield 'quick_check', 0 if messages == ['ok'] else len(messages), messages[:5]
+
+    for table in QUESTION_TABLES:
+        c.execute(f'''
+            SELECT t.question_id FROM {table} t
+            LEFT JOIN questions q ON q.id = t.question_id
+            WHERE q.id IS NULL
+        ''')
+        orphans = [row[0] for row in c.fetchall()]
+        yield f'history_{table}', len(orphans), sorted(set(orphans))[:10]
+
+    c.execute('''
+        SELECT user_id, question_id, COUNT(*) FROM progress
+        GROUP BY user_id, question_id HAVING COUNT(*) > 1
+    ''')
+    duplicates = c.fetchall()
+    yield 'duplicate_progress', sum(n - 1 for _, _, n in duplicates), [qid for _, qid, _ in duplicates[:10]]
+
+    c.execute(f'''
+        SELECT question_id FROM progress
+        WHERE completed_day IS NOT {app.EPOCH_DAY_SQL.format('completed_date')}
+           OR last_review_day IS NOT {app.EPOCH_DAY_SQL.format('last_review_date')}
+    ''')
+    stale = [row[0] for row in c.fetchall()]
+    yield 'stale_epoch_days', len(stale), stale[:10]
+
+    c.execute('SELECT id FROM questions')
+    question_ids = {row[0] for row in c.fetchall()}
+    c.execute('SELECT day_number, sessions FROM daily_plans')
+    missing = [(day, qid) for day, sessions in c.fetchall()
+               for ids in json.loads(sessions).values() for qid in ids if qid not in question_ids]
+    yield 'plan_missing_questions', len(missing), missing[:10]
+
+
+def fix_problems(c, found):
+    """Repair what check found: drop duplicates, recompute epoch days, rebuild plans"""
+    fixed = {}
+    if found.get('duplicate_progress'):
+        # Keep the newest row of each (user, question)
+        c.execute('''
+            DELETE FROM progress WHERE id NOT IN
+                (SELECT MAX(id) FROM progress GROUP BY user_id, question_id)
+        ''')
+        fixed['duplicate_progress'] = c.rowcount
+    if found.get('stale_epoch_days'):
+        c.execute(f'''
+            UPDATE progress
+            SET completed_day = {app.EPOCH_DAY_SQL.format('completed_date')},
+                last_review_day = {app.EPOCH_DAY_SQL.format('last_review_date')}
+            WHERE completed_day IS NOT {app.EPOCH_DAY_SQL.format('completed_date')}
+               OR last_review_day IS NOT {app.EPOCH_DAY_SQL.format('last_review_date')}
+        ''')
+        fixed['stale_epoch_days'] = c.rowcount
+    if found.get('plan_missing_questions'):
+        app.materialize_daily_plans(c, app.create_30_day_plan())
+        fixed['plan_missing_questions'] = found['plan_missing_questions']
+    if 'duplicate_progress' in fixed:
+        recompute_statistics(c)
+    return fixed
+
+
+def cmd_check(args):
+    conn = app.get_db_connection()
+    try:
+        c = conn.cursor()
+        checks = {}
+        for name, count, sample in find_problems(c):
+            if name.startswith('history_'):
+                # Not a problem: rows for questions removed from the catalogue are kept
+                checks[name] = {'rows': count, 'sample': sample}
+                print(f"{name}: {count} row(s) kept for removed questions", file=sys.stderr, flush=True)
+                continue
+            checks[name] = {'problems': count, 'sample': sample}
+            print(f"{name}: {'ok' if count == 0 else f'{count} problem(s)'}", file=sys.stderr, flush=True)
+        found = {name: result['problems'] for name, result in checks.items() if result.get('problems')}
+        result = {'checks': checks, 'ok': not found}
+        if args.fix and found:
+            if 'quick_check' in found:
+                raise ValueError('quick_check failed; restore from a backup instead of fixing in place')
+            c.execute('BEGIN IMMEDIATE')
+            result['fixed'] = fix_problems(c, found)
+            conn.commit()
+    finally:
+        conn.close()
+    if not result['ok'] and not args.fix:
+        result['hint'] = 'Run with --fix to repair'
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Study plan database administration')
+    parser.add_argument('--database', help=f'Database file (default {app.DATABASE})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('backup', help='Online backup with the SQLite backup API')
+    p.add_argument('--dir', default=BACKUP_DIR)
+    p.add_argument('--keep', type=int, default=BACKUP_KEEP, help='Backups to keep (0 keeps all)')
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser('checkpoint', help='Checkpoint the WAL into the database')
+    p.add_argument('--mode', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'])
+    p.set_defaults(func=cmd_checkpoint)
+
+    p = sub.add_parser('vacuum', help='Incremental vacuum of free pages')
+    p.add_argument('--pages', type=int, default=maintenance.VACUUM_PAGES, help='Pages to free (0 frees all)')
+    p.add_argument('--full', action='store_true',
+                   help='Switch an older database to auto_vacuum=INCREMENTAL (one full VACUUM)')
+    p.set_defaults(func=cmd_vacuum)
+
+    p = sub.add_parser('optimize', help='Refresh query planner statistics')
+    p.add_argument('--analyze', action='store_true', help='Run a full ANALYZE instead of PRAGMA optimize')
+    p.set_defaults(func=cmd_optimize)
+
+    p = sub.add_parser('stats', help='Database and WAL sizes')
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('maintain', help='Run several tasks in one pass')
+    p.add_argument('--tasks', default='backup,checkpoint,vacuum,optimize')
+    p.add_argument('--dir', default=BACKUP_DIR)
+    p.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    p.set_defaults(func=cmd_maintain)
+
+    p = sub.add_parser('seed', help='Create or upgrade the database and seed questions and plans')
+    p.add_argument('--reseed', action='store_true', help='Re-import questions.json and rebuild the daily plans')
+    p.set_defaults(func=cmd_seed, creates=True)
+
+    p = sub.add_parser('reset-progress', help='Delete all progress, attempts and timers')
+    p.add_argument('--yes', action='store_true', help='Confirm the deletion')
+    p.set_defaults(func=cmd_reset_progress)
+
+    p = sub.add_parser('migrate-user', help='Move all of one user id\'s data to another (the default user)')
+    p.add_argument('source')
+    p.add_argument('target')
+    p.set_defaults(func=cmd_migrate_user)
+
+    p = sub.add_parser('recompute-stats', help='Rebuild rollups, streaks and totals from the attempt log')
+    p.set_defaults(func=cmd_recompute_stats)
+
+    p = sub.add_parser('export', help='Export progress, attempts and settings as JSON lines')
+    p.add_argument('--out', help='Output file (default stdout)')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('import', help='Import a JSON lines export')
+    p.add_argument('file')
+    p.add_argument('--replace', action='store_true', help='Replace the existing data')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('check', help='Integrity checks: duplicate progress, stale epoch days and plans')
+    p.add_argument('--fix', action='store_true', help='Repair what the checks find')
+    p.set_defaults(func=cmd_check)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.database:
+        app.DATABASE = os.path.abspath(args.database)
+    if not os.path.exists(app.DATABASE) and not getattr(args, 'creates', False):
+        print(f"Error: database not found at {app.DATABASE}; run 'python manage.py seed' first", file=sys.stderr)
+        return 1
+    try:
+        result = args.func(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    # check exits non-zero when it found problems it was not asked to fix
+    return 0 if result.get('ok', True) or result.get('fixed') is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
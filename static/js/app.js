@@ -3,13 +3,223 @@ let statistics = {};
 let startDate = null;
 let todayDate = null;
 
+// Offline mutation queue (IndexedDB) and delta sync state
+const SYNC_DB_NAME = 'leetcode-plan';
+const SYNC_STORE = 'mutations';
+let syncDbPromise = null;
+let flushPromise = null;
+// Batch whose response never arrived ({ids, key}); it is resent first with the same key
+let unconfirmedBatch = null;
+
+// Open question timers (questionId -> {state, elapsed, syncedAt}), ticked locally
+const timers = {};
+let timerInterval = null;
+
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
-    loadCurrentDay();
+    // Study days start at the learner's midnight, so tell the server our timezone first
+    syncTimezone().finally(() => loadCurrentDay());
     initDayGrid();
     loadStatistics();
+    loadActiveTimers();
+    flushQueue().then(() => pullChanges());
 });
 
+// Replay queued mutations when the connection comes back
+window.addEventListener('online', async function() {
+    await flushQueue();
+    if (await pullChanges()) {
+        loadDay(currentDay);
+        loadStatistics();
+    }
+});
+
+// Pick up changes made from other devices when the tab regains focus
+document.addEventListener('visibilitychange', async function() {
+    if (document.visibilityState === 'visible' && navigator.onLine) {
+        if (await pullChanges()) {
+            loadDay(currentDay);
+            loadStatistics();
+        }
+    }
+});
+
+// Open (or create) the IndexedDB mutation queue
+function openSyncDb() {
+    if (!window.indexedDB) {
+        return Promise.resolve(null);
+    }
+    if (!syncDbPromise) {
+        syncDbPromise = new Promise((resolve) => {
+            const request = indexedDB.open(SYNC_DB_NAME, 1);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore(SYNC_STORE, { keyPath: 'id', autoIncrement: true });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null); // Fall back to direct requests
+        });
+    }
+    return syncDbPromise;
+}
+
+// Run a single IndexedDB request inside a transaction on the queue store
+async function withSyncStore(mode, callback) {
+    const db = await openSyncDb();
+    if (!db) return null;
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(SYNC_STORE, mode);
+        const request = callback(tx.objectStore(SYNC_STORE));
+        tx.oncomplete = () => resolve(request ? request.result : null);
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+// Add a mutation to the end of the queue, returns its queue id.
+// It is stamped with the time the user acted, so a late replay keeps its original day
+function enqueueMutation(mutation) {
+    if (!mutation.at) mutation.at = new Date().toISOString();
+    return withSyncStore('readwrite', store => store.add({ mutation: mutation }));
+}
+
+// Get all queued mutations in insertion order
+async function getQueuedMutations() {
+    return (await withSyncStore('readonly', store => store.getAll())) || [];
+}
+
+// Remove mutations from the queue once the server has applied them
+function removeQueuedMutations(ids) {
+    return withSyncStore('readwrite', store => {
+        ids.forEach(id => store.delete(id));
+        return null;
+    });
+}
+
+// Send every queued mutation in one /api/batch request (only one flush runs at a time)
+function flushQueue() {
+    if (!flushPromise) {
+        flushPromise = drainQueue().finally(() => { flushPromise = null; });
+    }
+    return flushPromise;
+}
+
+// Random key so the server can recognise a retried write and replay its response
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function drainQueue() {
+    let entries = await getQueuedMutations();
+    while (entries.length > 0) {
+        // Retry an unconfirmed batch exactly as sent, so the server can recognise it
+        if (unconfirmedBatch && unconfirmedBatch.ids.every(id => entries.some(e => e.id === id))) {
+            entries = entries.filter(e => unconfirmedBatch.ids.includes(e.id));
+        } else {
+            unconfirmedBatch = { ids: entries.map(e => e.id), key: newIdempotencyKey() };
+        }
+        
+        let response;
+        try {
+            response = await fetch('/api/batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': unconfirmedBatch.key
+                },
+                body: JSON.stringify({ mutations: entries.map(e => e.mutation) })
+            });
+        } catch (error) {
+            return 'queued'; // Still offline, keep everything for the next attempt
+        }
+        unconfirmedBatch = null;
+        
+        if (response.ok) {
+            await removeQueuedMutations(entries.map(e => e.id));
+        } else if (response.status === 400) {
+            // The server will never accept this item, drop it so the rest can go through
+            const result = await response.json();
+            const rejected = entries[result.index || 0];
+            await removeQueuedMutations([rejected.id]);
+            console.error('Dropped rejected mutation:', rejected.mutation, result.error);
+            return 'failed';
+        } else {
+            return 'failed';
+        }
+        entries = await getQueuedMutations();
+    }
+    return 'sent';
+}
+
+// Queue a mutation and try to deliver it: 'sent', 'queued' (offline) or 'failed'
+async function sendMutation(mutation) {
+    const id = await enqueueMutation(mutation);
+    
+    if (id === null) {
+        // No IndexedDB available, talk to the server directly
+        try {
+            const response = await fetch('/api/batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ mutations: [mutation] })
+            });
+            return response.ok ? 'sent' : 'failed';
+        } catch (error) {
+            return 'failed';
+        }
+    }
+    
+    let status = await flushQueue();
+    let queued = (await getQueuedMutations()).some(e => e.id === id);
+    if (queued && status === 'sent') {
+        // A flush that started before we enqueued just finished, run one for our item
+        status = await flushQueue();
+        queued = (await getQueuedMutations()).some(e => e.id === id);
+    }
+    if (queued) return 'queued';
+    return status === 'failed' ? 'failed' : 'sent';
+}
+
+// Save the browser's timezone unless one has already been chosen
+async function syncTimezone() {
+    const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    if (!timezone) return;
+    try {
+        const response = await fetch('/api/settings/timezone');
+        const data = await response.json();
+        if (data.timezone) return;
+        await fetch('/api/settings/timezone', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ timezone: timezone })
+        });
+    } catch (error) {
+        console.error('Failed to sync timezone:', error);
+    }
+}
+
+// Fetch changes since the last seen version, returns true if anything changed
+async function pullChanges() {
+    const since = parseInt(localStorage.getItem('syncVersion') || '0');
+    let changed = false;
+    try {
+        let hasMore = true;
+        let version = since;
+        while (hasMore) {
+            const response = await fetch(`/api/sync?since=${version}`);
+            const data = await response.json();
+            changed = changed || data.changes.length > 0;
+            version = data.version;
+            hasMore = data.has_more;
+        }
+        localStorage.setItem('syncVersion', version);
+    } catch (error) {
+        console.error('Failed to sync changes:', error);
+    }
+    return changed && since > 0;
+}
+
 // Load current day from server
 async function loadCurrentDay() {
     try {
@@ -210,6 +420,7 @@ function displayPlan(data) {
     }
     
     content.innerHTML = html;
+    renderTimerButtons();
     updateHeaderStats();
     updateDayCompletionStatus(data.day);
 }
@@ -295,66 +506,139 @@ function renderQuestion(q) {
                     ? `<button class="action-btn btn-undo" onclick="markIncomplete(${q.id})">Undo</button>`
                     : `<button class="action-btn btn-complete" onclick="markComplete(${q.id}, true)">${forReview ? 'Review Complete' : 'Complete'}</button>
                        <button class="action-btn btn-wrong" onclick="markComplete(${q.id}, false)">Wrong</button>
-                       <button class="action-btn btn-defer" onclick="deferQuestion(${q.id})" title="Mark as 'Do Later'">⏰ Later</button>`
+                       <button class="action-btn btn-defer" onclick="deferQuestion(${q.id})" title="Mark as 'Do Later'">⏰ Later</button>
+                       ${timerButton(q.id)}`
                 }
             </div>
         </div>
     `;
 }
 
-// Mark as complete
-async function markComplete(questionId, isCorrect) {
+// Timer button for a question card, labelled from its current timer state
+function timerButton(questionId) {
+    return `<button class="action-btn btn-timer" data-question-id="${questionId}" onclick="toggleTimer(${questionId})" title="Time this problem">${timerLabel(questionId)}</button>`;
+}
+
+function timerLabel(questionId) {
+    const timer = timers[questionId];
+    if (!timer) return '▶ Start';
+    return `${timer.state === 'running' ? '⏸' : '▶'} ${formatDuration(timerElapsed(timer))}`;
+}
+
+function timerElapsed(timer) {
+    const running = timer.state === 'running' ? (Date.now() - timer.syncedAt) / 1000 : 0;
+    return Math.floor(timer.elapsed + running);
+}
+
+function formatDuration(seconds) {
+    const minutes = Math.floor(seconds / 60);
+    return `${minutes}:${String(seconds % 60).padStart(2, '0')}`;
+}
+
+function setTimer(timer) {
+    if (timer.state === 'idle') {
+        delete timers[timer.question_id];
+    } else {
+        timers[timer.question_id] = { state: timer.state, elapsed: timer.elapsed, syncedAt: Date.now() };
+    }
+}
+
+// Refresh timer button labels, ticking once a second while any timer runs
+function renderTimerButtons() {
+    document.querySelectorAll('.btn-timer').forEach(btn => {
+        btn.textContent = timerLabel(Number(btn.dataset.questionId));
+    });
+    const anyRunning = Object.values(timers).some(t => t.state === 'running');
+    if (anyRunning && !timerInterval) {
+        timerInterval = setInterval(renderTimerButtons, 1000);
+    } else if (!anyRunning && timerInterval) {
+        clearInterval(timerInterval);
+        timerInterval = null;
+    }
+}
+
+// Restore timers left open in an earlier visit
+async function loadActiveTimers() {
+    try {
+        const response = await fetch('/api/timing/active');
+        const data = await response.json();
+        data.timers.forEach(setTimer);
+        renderTimerButtons();
+    } catch (error) {
+        console.error('Failed to load timers:', error);
+    }
+}
+
+// Start, pause or resume a question's timer; completing the question stops it
+async function toggleTimer(questionId) {
+    const running = timers[questionId] && timers[questionId].state === 'running';
     try {
-        const response = await fetch('/api/progress', {
+        const response = await fetch(`/api/timing/${running ? 'pause' : 'start'}`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: questionId,
-                is_correct: isCorrect
-            })
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ question_id: questionId })
         });
-        
-        if (response.ok) {
-            // Find the question card element by searching for the button that was clicked
-            let questionCard = null;
-            const allCards = document.querySelectorAll('.question-card');
-            for (const card of allCards) {
-                const actionsDiv = card.querySelector('.question-actions');
-                if (actionsDiv) {
-                    const buttons = actionsDiv.querySelectorAll('button');
-                    for (const btn of buttons) {
-                        if (btn.getAttribute('onclick') && btn.getAttribute('onclick').includes(`markComplete(${questionId}`)) {
-                            questionCard = card;
-                            break;
-                        }
-                    }
+        const result = await response.json();
+        if (!result.success) {
+            alert('Timer update failed: ' + (result.error || 'Unknown error'));
+            return;
+        }
+        setTimer(result.timer);
+        renderTimerButtons();
+    } catch (error) {
+        console.error('Failed to update timer:', error);
+        alert('Timer needs a connection, please try again');
+    }
+}
+
+// Find the card whose action buttons call the given handler for a question
+function findQuestionCard(handlerName, questionId) {
+    const allCards = document.querySelectorAll('.question-card');
+    for (const card of allCards) {
+        const actionsDiv = card.querySelector('.question-actions');
+        if (actionsDiv) {
+            const buttons = actionsDiv.querySelectorAll('button');
+            for (const btn of buttons) {
+                if (btn.getAttribute('onclick') && btn.getAttribute('onclick').includes(`${handlerName}(${questionId}`)) {
+                    return card;
                 }
-                if (questionCard) break;
             }
-            
-            // Check if this is a review question
-            const isReviewQuestion = questionCard && questionCard.classList.contains('for-review');
-            
-            if (isReviewQuestion && questionCard) {
-                // For review questions, just update the UI without reloading
-                updateQuestionCardStatus(questionCard, questionId, isCorrect);
-            } else {
-                // For regular questions, reload the day plan
-                loadDay(currentDay);
-            }
-            
-            loadStatistics();
-            // Update completion status for current day
-            updateDayCompletionStatus(currentDay);
-        } else {
-            alert('Update failed, please try again');
         }
-    } catch (error) {
-        console.error('Failed to mark complete:', error);
-        alert('Operation failed, please try again');
     }
+    return null;
+}
+
+// Mark as complete
+async function markComplete(questionId, isCorrect) {
+    const questionCard = findQuestionCard('markComplete', questionId);
+    const status = await sendMutation({
+        type: 'progress',
+        question_id: questionId,
+        is_correct: isCorrect
+    });
+    
+    if (status === 'failed') {
+        alert('Update failed, please try again');
+        return;
+    }
+    // The server folds an open timer into the completion
+    delete timers[questionId];
+    
+    // Check if this is a review question
+    const isReviewQuestion = questionCard && questionCard.classList.contains('for-review');
+    
+    if (status === 'queued' || isReviewQuestion) {
+        // Offline or review question: update the card in place without reloading
+        updateQuestionCardStatus(questionCard, questionId, isCorrect);
+        if (status === 'queued') return;
+    } else {
+        // For regular questions, reload the day plan
+        loadDay(currentDay);
+    }
+    
+    loadStatistics();
+    // Update completion status for current day
+    updateDayCompletionStatus(currentDay);
 }
 
 // Update question card status without reloading
@@ -394,54 +678,33 @@ function updateQuestionCardStatus(cardElement, questionId, isCorrect) {
 
 // Mark as incomplete
 async function markIncomplete(questionId) {
-    try {
-        const response = await fetch('/api/progress', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: questionId,
-                is_correct: null  // Indicates undo
-            })
-        });
-        
-        if (response.ok) {
-            // Find the question card element
-            let questionCard = null;
-            const allCards = document.querySelectorAll('.question-card');
-            for (const card of allCards) {
-                const actionsDiv = card.querySelector('.question-actions');
-                if (actionsDiv) {
-                    const buttons = actionsDiv.querySelectorAll('button');
-                    for (const btn of buttons) {
-                        if (btn.getAttribute('onclick') && btn.getAttribute('onclick').includes(`markIncomplete(${questionId}`)) {
-                            questionCard = card;
-                            break;
-                        }
-                    }
-                }
-                if (questionCard) break;
-            }
-            
-            // Check if this is a review question
-            const isReviewQuestion = questionCard && questionCard.classList.contains('for-review');
-            
-            if (isReviewQuestion && questionCard) {
-                // For review questions, restore the original buttons
-                restoreQuestionCardButtons(questionCard, questionId);
-            } else {
-                // For regular questions, reload the day plan
-                loadDay(currentDay);
-            }
-            
-            loadStatistics();
-            // Update completion status for current day
-            updateDayCompletionStatus(currentDay);
-        }
-    } catch (error) {
-        console.error('Failed to undo:', error);
+    const questionCard = findQuestionCard('markIncomplete', questionId);
+    const status = await sendMutation({
+        type: 'progress',
+        question_id: questionId,
+        is_correct: null  // Indicates undo
+    });
+    
+    if (status === 'failed') {
+        console.error('Failed to undo');
+        return;
     }
+    
+    // Check if this is a review question
+    const isReviewQuestion = questionCard && questionCard.classList.contains('for-review');
+    
+    if (status === 'queued' || isReviewQuestion) {
+        // Offline or review question: restore the original buttons in place
+        restoreQuestionCardButtons(questionCard, questionId);
+        if (status === 'queued') return;
+    } else {
+        // For regular questions, reload the day plan
+        loadDay(currentDay);
+    }
+    
+    loadStatistics();
+    // Update completion status for current day
+    updateDayCompletionStatus(currentDay);
 }
 
 // Restore question card buttons after undo
@@ -459,6 +722,7 @@ function restoreQuestionCardButtons(cardElement, questionId) {
             <button class="action-btn btn-complete" onclick="markComplete(${questionId}, true)">${isReview ? 'Review Complete' : 'Complete'}</button>
             <button class="action-btn btn-wrong" onclick="markComplete(${questionId}, false)">Wrong</button>
             <button class="action-btn btn-defer" onclick="deferQuestion(${questionId})" title="Mark as 'Do Later'">⏰ Later</button>
+            ${timerButton(questionId)}
         `;
     }
     
@@ -474,27 +738,21 @@ function restoreQuestionCardButtons(cardElement, questionId) {
 
 // Defer question (mark as "do later")
 async function deferQuestion(questionId) {
-    try {
-        const response = await fetch('/api/defer', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: questionId
-            })
-        });
-        
-        if (response.ok) {
-            loadDay(currentDay);
-            loadStatistics();
-            alert('Question marked as "Do Later". It will be hidden from today\'s plan.');
-        } else {
-            alert('Failed to mark as "Do Later", please try again');
-        }
-    } catch (error) {
-        console.error('Failed to defer question:', error);
-        alert('Operation failed, please try again');
+    const questionCard = findQuestionCard('deferQuestion', questionId);
+    const status = await sendMutation({
+        type: 'defer',
+        question_id: questionId
+    });
+    
+    if (status === 'failed') {
+        alert('Failed to mark as "Do Later", please try again');
+    } else if (status === 'queued') {
+        // Offline: hide the card now, the server catches up on reconnect
+        if (questionCard) questionCard.remove();
+    } else {
+        loadDay(currentDay);
+        loadStatistics();
+        alert('Question marked as "Do Later". It will be hidden from today\'s plan.');
     }
 }
 
@@ -552,6 +810,10 @@ async function showStatistics() {
             <h3>Streak</h3>
             <div class="number">${statistics.streak_days || 0} days</div>
         </div>
+        <div class="stat-box">
+            <h3>Longest Streak</h3>
+            <div class="number">${statistics.longest_streak || 0} days</div>
+        </div>
     `;
     
     if (statistics.by_category) {
@@ -578,54 +840,85 @@ async function showStatistics() {
     modal.style.display = 'block';
 }
 
-// Show review list
-async function showReview() {
+// Paginated modal lists: cursor state per list name
+const pagedLists = {};
+
+// Load the next page of a cursor-paginated list into its modal (reset starts over)
+async function loadPagedList(name, options, reset) {
+    let state = pagedLists[name];
+    if (reset || !state) {
+        state = pagedLists[name] = { cursor: null, loading: false, done: false };
+    }
+    if (state.loading || state.done) return;
+    
+    state.loading = true;
+    const modal = document.getElementById(options.modalId);
+    const modalContent = modal.querySelector('.modal-content');
     try {
-        const response = await fetch('/api/review');
-        
+        const url = options.url + (state.cursor ? `?cursor=${encodeURIComponent(state.cursor)}` : '');
+        const response = await fetch(url);
         if (!response.ok) {
-            const errorText = await response.text();
-            console.error('Failed to load review list:', response.status, errorText);
-            alert('Failed to load review list. Please try again.');
-            return;
+            throw new Error(`HTTP ${response.status}: ${await response.text()}`);
         }
+        const data = await response.json();
+        if (pagedLists[name] !== state) return; // A newer reset took over
         
-        const reviewQuestions = await response.json();
-        const modal = document.getElementById('review-modal');
-        const content = document.getElementById('review-content');
-        
-        if (!Array.isArray(reviewQuestions)) {
-            console.error('Invalid response format:', reviewQuestions);
-            alert('Invalid response format. Please try again.');
-            return;
+        const content = document.getElementById(options.contentId);
+        if (reset) {
+            content.innerHTML = data.items.length === 0 ? options.emptyHtml : '<div class="review-list"></div>';
+            modal.style.display = 'block';
+            modalContent.scrollTop = 0;
+            modalContent.onscroll = () => {
+                if (modalContent.scrollTop + modalContent.clientHeight >= modalContent.scrollHeight - 50) {
+                    loadPagedList(name, options, false).catch(error => console.error(`Failed to load more (${name}):`, error));
+                }
+            };
         }
-        
-        if (reviewQuestions.length === 0) {
-            content.innerHTML = '<p style="text-align: center; padding: 40px; color: #666;">✅ No questions to review today, keep it up!</p>';
-        } else {
-            let html = '<div class="review-list">';
-            reviewQuestions.forEach(q => {
-                html += `
-                    <div class="review-item">
-                        <div style="font-weight: bold; margin-bottom: 5px;">
-                            <a href="https://leetcode.com/problems/${q.title.toLowerCase().replace(/\s+/g, '-')}/" 
-                               target="_blank" style="text-decoration: none; color: #667eea;">
-                                ${q.title}
-                            </a>
-                            <span class="difficulty ${q.difficulty.toLowerCase()}" style="margin-left: 10px;">${q.difficulty}</span>
-                        </div>
-                        <div style="color: #666; font-size: 0.9em;">
-                            Category: ${q.category} | Completed: ${q.completed_date}
-                            ${q.is_correct === 0 ? ' | <span style="color: #f44336;">⚠️ Previously Wrong</span>' : ''}
-                        </div>
-                    </div>
-                `;
-            });
-            html += '</div>';
-            content.innerHTML = html;
+        const list = content.querySelector('.review-list');
+        if (list) {
+            list.insertAdjacentHTML('beforeend', data.items.map(options.renderItem).join(''));
         }
-        
-        modal.style.display = 'block';
+        state.cursor = data.next_cursor;
+        state.done = !data.next_cursor;
+    } finally {
+        state.loading = false;
+    }
+    
+    // Keep filling until the modal can scroll, otherwise no scroll event would ever fire
+    if (!state.done && modalContent.scrollHeight <= modalContent.clientHeight) {
+        await loadPagedList(name, options, false);
+    }
+}
+
+// Render one review list entry
+function renderReviewItem(q) {
+    return `
+        <div class="review-item">
+            <div style="font-weight: bold; margin-bottom: 5px;">
+                <a href="https://leetcode.com/problems/${q.title.toLowerCase().replace(/\s+/g, '-')}/" 
+                   target="_blank" style="text-decoration: none; color: #667eea;">
+                    ${q.title}
+                </a>
+                <span class="difficulty ${q.difficulty.toLowerCase()}" style="margin-left: 10px;">${q.difficulty}</span>
+            </div>
+            <div style="color: #666; font-size: 0.9em;">
+                Category: ${q.category} | Completed: ${q.completed_date}
+                ${q.is_correct === 0 ? ' | <span style="color: #f44336;">⚠️ Previously Wrong</span>' : ''}
+            </div>
+        </div>
+    `;
+}
+
+// Show review list
+async function showReview() {
+    try {
+        await loadPagedList('review', {
+            url: '/api/review',
+            modalId: 'review-modal',
+            contentId: 'review-content',
+            emptyHtml: '<p style="text-align: center; padding: 40px; color: #666;">✅ No questions to review today, keep it up!</p>',
+            renderItem: renderReviewItem
+        }, true);
     } catch (error) {
         console.error('Failed to load review list:', error);
         alert('Failed to load review list: ' + error.message);
@@ -637,45 +930,40 @@ function closeModal(modalId) {
     document.getElementById(modalId).style.display = 'none';
 }
 
+// Render one deferred list entry
+function renderDeferredItem(q) {
+    return `
+        <div class="review-item">
+            <div style="font-weight: bold; margin-bottom: 5px;">
+                <a href="https://leetcode.com/problems/${q.title.toLowerCase().replace(/\s+/g, '-')}/" 
+                   target="_blank" style="text-decoration: none; color: #667eea;">
+                    ${q.title}
+                </a>
+                <span class="difficulty ${q.difficulty.toLowerCase()}" style="margin-left: 10px;">${q.difficulty}</span>
+            </div>
+            <div style="color: #666; font-size: 0.9em; margin-bottom: 10px;">
+                Category: ${q.category} | Day ${q.day_number}
+                ${q.deferred_date ? ` | Deferred: ${q.deferred_date}` : ''}
+                ${q.completed ? ` | <span style="color: #4caf50;">Completed</span>` : ''}
+            </div>
+            <div>
+                <button class="action-btn btn-complete" onclick="undeferQuestion(${q.id})" style="margin-right: 10px;">Restore</button>
+                ${!q.completed ? `<button class="action-btn btn-complete" onclick="undeferAndComplete(${q.id}, true)">Restore & Complete</button>` : ''}
+            </div>
+        </div>
+    `;
+}
+
 // Show deferred questions
 async function showDeferred() {
     try {
-        const response = await fetch('/api/deferred');
-        const deferredQuestions = await response.json();
-        const modal = document.getElementById('deferred-modal');
-        const content = document.getElementById('deferred-content');
-        
-        if (deferredQuestions.length === 0) {
-            content.innerHTML = '<p style="text-align: center; padding: 40px; color: #666;">✅ No questions marked as "Do Later"</p>';
-        } else {
-            let html = '<div class="review-list">';
-            deferredQuestions.forEach(q => {
-                html += `
-                    <div class="review-item">
-                        <div style="font-weight: bold; margin-bottom: 5px;">
-                            <a href="https://leetcode.com/problems/${q.title.toLowerCase().replace(/\s+/g, '-')}/" 
-                               target="_blank" style="text-decoration: none; color: #667eea;">
-                                ${q.title}
-                            </a>
-                            <span class="difficulty ${q.difficulty.toLowerCase()}" style="margin-left: 10px;">${q.difficulty}</span>
-                        </div>
-                        <div style="color: #666; font-size: 0.9em; margin-bottom: 10px;">
-                            Category: ${q.category} | Day ${q.day_number}
-                            ${q.deferred_date ? ` | Deferred: ${q.deferred_date}` : ''}
-                            ${q.completed ? ` | <span style="color: #4caf50;">Completed</span>` : ''}
-                        </div>
-                        <div>
-                            <button class="action-btn btn-complete" onclick="undeferQuestion(${q.id})" style="margin-right: 10px;">Restore</button>
-                            ${!q.completed ? `<button class="action-btn btn-complete" onclick="undeferAndComplete(${q.id}, true)">Restore & Complete</button>` : ''}
-                        </div>
-                    </div>
-                `;
-            });
-            html += '</div>';
-            content.innerHTML = html;
-        }
-        
-        modal.style.display = 'block';
+        await loadPagedList('deferred', {
+            url: '/api/deferred',
+            modalId: 'deferred-modal',
+            contentId: 'deferred-content',
+            emptyHtml: '<p style="text-align: center; padding: 40px; color: #666;">✅ No questions marked as "Do Later"</p>',
+            renderItem: renderDeferredItem
+        }, true);
     } catch (error) {
         console.error('Failed to load deferred list:', error);
         alert('Failed to load "Do Later" list');
@@ -684,51 +972,35 @@ async function showDeferred() {
 
 // Undefer question (restore to plan)
 async function undeferQuestion(questionId) {
-    try {
-        const response = await fetch('/api/undefer', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: questionId
-            })
-        });
-        
-        if (response.ok) {
-            showDeferred(); // Refresh the list
-            loadDay(currentDay); // Refresh current day plan
-            alert('Question restored to your plan');
-        } else {
-            alert('Failed to restore question, please try again');
-        }
-    } catch (error) {
-        console.error('Failed to undefer question:', error);
-        alert('Operation failed, please try again');
+    const status = await sendMutation({
+        type: 'undefer',
+        question_id: questionId
+    });
+    
+    if (status === 'sent') {
+        showDeferred(); // Refresh the list
+        loadDay(currentDay); // Refresh current day plan
+        alert('Question restored to your plan');
+    } else if (status === 'queued') {
+        alert('You are offline, the question will be restored once you reconnect');
+    } else {
+        alert('Failed to restore question, please try again');
     }
 }
 
 // Undefer and mark as complete
 async function undeferAndComplete(questionId, isCorrect) {
-    try {
-        // First undefer
-        const undeferResponse = await fetch('/api/undefer', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question_id: questionId
-            })
-        });
-        
-        if (undeferResponse.ok) {
-            // Then mark as complete
-            await markComplete(questionId, isCorrect);
-            showDeferred(); // Refresh the list
-        }
-    } catch (error) {
-        console.error('Failed to undefer and complete:', error);
+    // Restore and complete are queued back to back and replayed in one batch
+    await enqueueMutation({ type: 'undefer', question_id: questionId });
+    const status = await sendMutation({ type: 'progress', question_id: questionId, is_correct: isCorrect });
+    
+    if (status === 'sent') {
+        showDeferred(); // Refresh the list
+        loadDay(currentDay); // Refresh current day plan
+        loadStatistics();
+    } else if (status === 'queued') {
+        alert('You are offline, the change will be saved once you reconnect');
+    } else {
         alert('Operation failed, please try again');
     }
 }
@@ -759,55 +1031,123 @@ async function saveNote(questionId) {
     
     const note = textarea.value;
     
+    const status = await sendMutation({
+        type: 'note',
+        question_id: questionId,
+        note: note
+    });
+    
+    if (status === 'failed') {
+        alert('Failed to save note, please try again');
+        return;
+    }
+    
+    // Update the note preview
+    const noteDiv = document.getElementById(`note-${questionId}`);
+    const previewDiv = noteDiv.querySelector('.note-preview');
+    if (note.trim()) {
+        if (previewDiv) {
+            previewDiv.innerHTML = note.replace(/\n/g, '<br>');
+        } else {
+            const preview = document.createElement('div');
+            preview.className = 'note-preview';
+            preview.innerHTML = note.replace(/\n/g, '<br>');
+            noteDiv.querySelector('.note-actions').after(preview);
+        }
+    } else {
+        if (previewDiv) {
+            previewDiv.remove();
+        }
+    }
+    
+    // Update note button icon
+    const noteBtn = noteDiv.parentElement.querySelector('.note-btn');
+    if (noteBtn) {
+        noteBtn.textContent = note.trim() ? '📝' : '📄';
+    }
+    
+    // Show success message briefly (queued notes are saved once back online)
+    const saveBtn = noteDiv.querySelector('.note-actions button');
+    const originalText = saveBtn.textContent;
+    saveBtn.textContent = status === 'queued' ? '✓ Saved offline' : '✓ Saved!';
+    saveBtn.style.background = '#4caf50';
+    setTimeout(() => {
+        saveBtn.textContent = originalText;
+        saveBtn.style.background = '';
+    }, 1500);
+}
+
+function escapeHtml(text) {
+    return String(text)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+// Note snippets are user text; escape it and only keep the server's <mark> highlights
+function renderSnippet(snippet) {
+    return escapeHtml(snippet)
+        .replace(/&lt;mark&gt;/g, '<mark>')
+        .replace(/&lt;\/mark&gt;/g, '</mark>');
+}
+
+// Search questions and notes
+async function searchQuestions(event, offset = 0) {
+    if (event) event.preventDefault();
+    const query = document.getElementById('search-input').value.trim();
+    if (!query) return;
+    
     try {
-        const response = await fetch(`/api/note/${questionId}`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ note: note })
+        const response = await fetch(`/api/search?q=${encodeURIComponent(query)}&offset=${offset}`);
+        const data = await response.json();
+        if (!response.ok) {
+            alert(data.error || 'Search failed, please try again');
+            return;
+        }
+        
+        const modal = document.getElementById('search-modal');
+        const content = document.getElementById('search-content');
+        
+        let list = content.querySelector('.review-list');
+        if (offset === 0 || !list) {
+            content.innerHTML = data.results.length === 0
+                ? `<p style="text-align: center; padding: 40px; color: #666;">No problems or notes match "${escapeHtml(query)}"</p>`
+                : '<div class="review-list"></div>';
+            list = content.querySelector('.review-list');
+        }
+        
+        content.querySelector('.load-more')?.remove();
+        data.results.forEach(q => {
+            list.insertAdjacentHTML('beforeend', `
+                <div class="review-item">
+                    <div style="font-weight: bold; margin-bottom: 5px;">
+                        <a href="#" onclick="closeModal('search-modal'); loadDay(${q.day_number}); return false;"
+                           style="text-decoration: none; color: #667eea;">
+                            ${q.title}
+                        </a>
+                        <span class="difficulty ${q.difficulty.toLowerCase()}" style="margin-left: 10px;">${q.difficulty}</span>
+                    </div>
+                    <div style="color: #666; font-size: 0.9em;">
+                        Category: ${q.category} | Day ${q.day_number} | #${q.leetcode_id}
+                    </div>
+                    ${q.snippet ? `<div class="search-snippet">📝 ${renderSnippet(q.snippet)}</div>` : ''}
+                </div>
+            `);
         });
         
-        if (response.ok) {
-            // Update the note preview
-            const noteDiv = document.getElementById(`note-${questionId}`);
-            const previewDiv = noteDiv.querySelector('.note-preview');
-            if (note.trim()) {
-                if (previewDiv) {
-                    previewDiv.innerHTML = note.replace(/\n/g, '<br>');
-                } else {
-                    const preview = document.createElement('div');
-                    preview.className = 'note-preview';
-                    preview.innerHTML = note.replace(/\n/g, '<br>');
-                    noteDiv.querySelector('.note-actions').after(preview);
-                }
-            } else {
-                if (previewDiv) {
-                    previewDiv.remove();
-                }
-            }
-            
-            // Update note button icon
-            const noteBtn = noteDiv.parentElement.querySelector('.note-btn');
-            if (noteBtn) {
-                noteBtn.textContent = note.trim() ? '📝' : '📄';
-            }
-            
-            // Show success message briefly
-            const saveBtn = noteDiv.querySelector('.note-actions button');
-            const originalText = saveBtn.textContent;
-            saveBtn.textContent = '✓ Saved!';
-            saveBtn.style.background = '#4caf50';
-            setTimeout(() => {
-                saveBtn.textContent = originalText;
-                saveBtn.style.background = '';
-            }, 1500);
-        } else {
-            alert('Failed to save note, please try again');
+        if (data.has_more) {
+            content.insertAdjacentHTML('beforeend', `
+                <button class="btn btn-secondary load-more" style="width: 100%; margin-top: 10px;"
+                        onclick="searchQuestions(null, ${data.next_offset})">Load More</button>
+            `);
         }
+        
+        modal.style.display = 'block';
     } catch (error) {
-        console.error('Failed to save note:', error);
-        alert('Failed to save note, please try again');
+        console.error('Failed to search:', error);
+        alert('Search failed, please try again');
     }
 }
 
@@ -0,0 +1,194 @@
+"""
+Storage layer for progress, settings and statistics.
+
+SQLiteStorage wraps an open sqlite3 connection, so its calls join whatever
+transaction the caller has open.
+Rows are plain dicts keyed by the field names below; dates are ISO strings.
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+PROGRESS_FIELDS = ('completed_date', 'is_correct', 'time_spent', 'notes', 'review_count',
+                   'last_review_date', 'deferred', 'deferred_date')
+STATISTICS_FIELDS = ('total_completed', 'total_correct', 'total_wrong', 'streak_days',
+                     'longest_streak', 'last_study_date')
+
+
+class Storage(ABC):
+    """Interface every storage backend implements"""
+
+    # Progress
+    @abstractmethod
+    def get_progress(self, question_id) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def save_progress(self, question_id, **fields):
+        """Update progress fields, creating the row if the question has none"""
+
+    @abstractmethod
+    def list_deferred(self, limit, after=None) -> List[Dict]:
+        """Deferred questions newest first, merged with their progress.
+
+        after is the (deferred_date, progress_id) of the previous page's last row.
+        Deferred rows always have a deferred_date, so the key seeks idx_progress_deferred.
+        """
+
+    @abstractmethod
+    def completion_totals(self) -> Dict:
+        """total_completed, total_correct and total_wrong over completed questions"""
+
+    @abstractmethod
+    def completed_by(self, field) -> Dict:
+        """Completed counts per 'category' or 'difficulty', largest first"""
+
+    # Settings
+    @abstractmethod
+    def get_setting(self, key) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set_setting(self, key, value):
+        ...
+
+    # Statistics
+    @abstractmethod
+    def get_statistics(self) -> Dict:
+        ...
+
+    @abstractmethod
+    def save_statistics(self, **fields):
+        ...
+
+    # Lifecycle
+    @abstractmethod
+    def transaction(self):
+        """Context manager: commit on success, roll back if the block raises"""
+
+    def close(self):
+        pass
+
+
+def check_fields(fields, allowed):
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+
+
+class SQLiteStorage(Storage):
+    """Storage over an open sqlite3 connection.
+
+    close() hands the connection to release (e.g. back to a pool) when given,
+    and otherwise leaves it to the caller.
+    """
+
+    def __init__(self, conn, release=None):
+        self.conn = conn
+        self.release = release
+
+    def _rows(self, sql, params=()):
+        c = self.conn.execute(sql, params)
+        columns = [d[0] for d in c.description]
+        return [dict(zip(columns, row)) for row in c.fetchall()]
+
+    def get_progress(self, question_id):
+        rows = self._rows(f'''
+            SELECT id AS progress_id, question_id, {", ".join(PROGRESS_FIELDS)}
+            FROM progress WHERE question_id = ?
+        ''', (question_id,))
+        return rows[0] if rows else None
+
+    def save_progress(self, question_id, **fields):
+        check_fields(fields, PROGRESS_FIELDS)
+        c = self.conn.cursor()
+        c.execute('SELECT id FROM progress WHERE question_id = ?', (question_id,))
+        if c.fetchone():
+            assignments = ', '.join(f'{name} = ?' for name in fields)
+            c.execute(f'UPDATE progress SET {assignments} WHERE question_id = ?',
+                      (*fields.values(), question_id))
+        else:
+            columns = ', '.join(('question_id',) + tuple(fields))
+            placeholders = ', '.join('?' * (len(fields) + 1))
+            c.execute(f'INSERT INTO progress ({columns}) VALUES ({placeholders})',
+                      (question_id, *fields.values()))
+
+    def list_deferred(self, limit, after=None):
+        keyset = ''
+        params = []
+        if after:
+            keyset = 'AND (p.deferred_date, p.id) < (?, ?)'
+            params = [after[0], after[1]]
+        return self._rows(f'''
+            SELECT q.*, p.id AS progress_id, p.deferred_date, p.completed_date, p.is_correct
+            FROM progress p
+            JOIN questions q ON q.id = p.question_id
+            WHERE p.deferred = 1 {keyset}
+            ORDER BY p.deferred_date DESC, p.id DESC
+            LIMIT ?
+        ''', params + [limit])
+
+    def completion_totals(self):
+        total, correct, wrong = self.conn.execute('''
+            SELECT
+                COUNT(*),
+                SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN is_correct = 0 THEN 1 ELSE 0 END)
+            FROM progress
+            WHERE completed_date IS NOT NULL
+        ''').fetchone()
+        return {'total_completed': total, 'total_correct': correct or 0, 'total_wrong': wrong or 0}
+
+    def completed_by(self, field):
+        check_fields((field,), ('category', 'difficulty'))
+        rows = self.conn.execute(f'''
+            SELECT q.{field}, COUNT(*) AS count
+            FROM questions q
+            JOIN progress p ON q.id = p.question_id
+            WHERE p.completed_date IS NOT NULL
+            GROUP BY q.{field}
+            ORDER BY count DESC
+        ''').fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def get_setting(self, key):
+        row = self.conn.execute('SELECT setting_value FROM user_settings WHERE setting_key = ?',
+                                (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key, value):
+        self.conn.execute('''
+            INSERT INTO user_settings (setting_key, setting_value) VALUES (?, ?)
+            ON CONFLICT (setting_key) DO UPDATE SET
+                setting_value = excluded.setting_value,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (key, value))
+
+    def get_statistics(self):
+        rows = self._rows(f'SELECT {", ".join(STATISTICS_FIELDS)} FROM statistics WHERE id = 1')
+        return rows[0] if rows else {}
+
+    def save_statistics(self, **fields):
+        check_fields(fields, STATISTICS_FIELDS)
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' * len(fields))
+        updates = ', '.join(f'{name} = excluded.{name}' for name in fields)
+        self.conn.execute(f'''
+            INSERT INTO statistics (id, {columns}, updated_at)
+            VALUES (1, {placeholders}, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET {updates}, updated_at = excluded.updated_at
+        ''', tuple(fields.values()))
+
+    @contextmanager
+    def transaction(self):
+        try:
+            yield self
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def close(self):
+        if self.release is not None:
+            self.release(self.conn)